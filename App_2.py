@@ -1,39 +1,19 @@
 import streamlit as st
-import tensorflow as tf
-import numpy as np
 from PIL import Image
-import time
-
-# Load models
-lung_model = tf.keras.models.load_model("./models/lung.hdf5")
-kidney_model = tf.keras.models.load_model("./models/Kidney_tumor.hdf5")
-brain_model = tf.keras.models.load_model("./models/Brain_Tumor.hdf5")
-
-# Define your Cancer classes (same as your original)
-# lung_cancer, kidney_cancer, brain_cancer definitions here...
-
-def preprocess_image(image):
-    img = image.convert("RGB")
-    img = img.resize((350, 350))
-    img = np.asarray(img) / 255.0
-    img = np.expand_dims(img, axis=0)
-    return img
-
-def predict(image, cancer_type):
-    if cancer_type.name == "Lung Cancer":
-        model = lung_model
-    elif cancer_type.name == "Kidney Cancer":
-        model = kidney_model
-    else:
-        model = brain_model
-
-    processed_image = preprocess_image(image)
-    prediction = model.predict(processed_image)[0]
-    class_index = np.argmax(prediction)
-    probability = prediction[class_index]
-    predicted_class = cancer_type.labels[class_index]
-
-    return predicted_class, probability, prediction
+
+from cancer_types import cancer_types_by_key
+from inference import predict_bytes
+
+# Models are loaded once per server process by the model registry. Cancer
+# types not listed here use the model file from cancer_types.json.
+MODEL_PATHS = {
+    "lung": "./models/lung.hdf5",
+    "kidney": "./models/Kidney_tumor.hdf5",
+    "brain": "./models/Brain_Tumor.hdf5",
+}
+
+def predict(image_bytes, cancer_type):
+    return predict_bytes(image_bytes, cancer_type, model_path=MODEL_PATHS.get(cancer_type.key))
 
 def main():
     st.set_page_config(
@@ -89,10 +69,10 @@ def main():
     st.markdown('<div class="subtitle">AI-powered Cancer Detection & Insights</div>', unsafe_allow_html=True)
 
     # Sidebar selection
-    cancer_types = [lung_cancer, kidney_cancer, brain_cancer]
-    options = [c.name for c in cancer_types]
-    selected_option = st.sidebar.selectbox("🔍 Select Cancer Type", options)
-    selected_cancer_type = next(c for c in cancer_types if c.name == selected_option)
+    selected_key = st.sidebar.selectbox(
+        "🔍 Select Cancer Type", list(cancer_types_by_key), format_func=lambda key: cancer_types_by_key[key].name
+    )
+    selected_cancer_type = cancer_types_by_key[selected_key]
     st.sidebar.markdown(f"**About:** {selected_cancer_type.description}")
 
     uploaded_file = st.file_uploader("📤 Upload a medical scan image", type=["jpg", "jpeg", "png"])
@@ -106,8 +86,7 @@ def main():
 
         with col2:
             with st.spinner("🔄 Analyzing image..."):
-                time.sleep(1)  # Small delay for animation effect
-                predicted_class, probability, full_probs = predict(image, selected_cancer_type)
+                predicted_class, probability, full_probs = predict(uploaded_file.getvalue(), selected_cancer_type)
 
             # Result card
             st.markdown(f"""
@@ -126,7 +105,7 @@ def main():
                 st.markdown(f"**{label}** — {prob:.2%}", unsafe_allow_html=True)
 
             # Messages
-            if predicted_class not in ["Normal", "no_tumor"]:
+            if not selected_cancer_type.is_normal(predicted_class):
                 st.warning(selected_cancer_type.true_positive_descriptions[predicted_class])
                 st.info("Please consult a doctor for further evaluation and treatment.")
             else:
@@ -0,0 +1,101 @@
+"""Check that alternative inference engines agree with the Keras models.
+
+Every image under the folder is scored by the reference engine (Keras) and
+by each engine under test. Accuracy is computed when the image's parent
+folder matches one of the model's labels, as in ``Testing/``. The command exits
+with status 1 when an engine's top-1 agreement with Keras is below
+``--min-agreement``, so it can gate exports in CI.
+
+Usage:
+    python backend_parity.py Testing --cancer-type brain --backends onnx tflite-int8
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from backends import BACKEND_NAMES, create_backend
+from cancer_types import cancer_types_by_key
+from image_folders import FolderLabels
+from score_images import iter_source_batches
+
+
+def compare_backends(cancer_type, folder, backend_names, batch_size=16, num_threads=None):
+    """Score ``folder`` with Keras and each backend; return a report per backend.
+
+    ``num_threads`` applies to the backends under test only: TensorFlow's
+    thread pools cannot be resized once a Keras model has been loaded.
+    """
+    backends = [create_backend("keras"), *(create_backend(name, num_threads) for name in backend_names)]
+    folder_labels = FolderLabels([cancer_type.labels[i] for i in sorted(cancer_type.labels)])
+    probabilities = {backend.name: [] for backend in backends}
+    truth = []
+    for paths, batch in iter_source_batches(folder, batch_size):
+        for backend in backends:
+            # Always compare against the per-organ file, not the merged model
+            probabilities[backend.name].append(
+                backend.predict(batch, cancer_type, model_path=cancer_type.model_path)
+            )
+        truth.extend(folder_labels(path) for path in paths)
+
+    truth = np.array(truth)
+    labelled = truth >= 0
+    reference = np.concatenate(probabilities["keras"])
+    report = {}
+    for name, chunks in probabilities.items():
+        probs = np.concatenate(chunks)
+        predicted = probs.argmax(axis=1)
+        report[name] = {
+            "images": int(len(probs)),
+            "accuracy": float((predicted[labelled] == truth[labelled]).mean()) if labelled.any() else None,
+            "top1_agreement_with_keras": float((predicted == reference.argmax(axis=1)).mean()),
+            "max_abs_probability_delta": float(np.abs(probs - reference).max()),
+            "mean_abs_probability_delta": float(np.abs(probs - reference).mean()),
+        }
+    keras_accuracy = report["keras"]["accuracy"]
+    for row in report.values():
+        row["accuracy_delta"] = (
+            row["accuracy"] - keras_accuracy if keras_accuracy is not None else None
+        )
+    return report
+
+
+def print_report(cancer_type, report):
+    for name, row in report.items():
+        accuracy = "n/a" if row["accuracy"] is None else f"{row['accuracy']:.2%}"
+        delta = "" if row["accuracy_delta"] is None else f" ({row['accuracy_delta']:+.2%})"
+        print(f"  {cancer_type.key:6} {name:15} accuracy {accuracy}{delta}, "
+              f"top-1 agreement {row['top1_agreement_with_keras']:.2%}, "
+              f"max |dp| {row['max_abs_probability_delta']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("folder", help="image folder, packed dataset or split.json:<split> to compare on, e.g. Testing")
+    parser.add_argument("-c", "--cancer-type", required=True, choices=list(cancer_types_by_key))
+    parser.add_argument(
+        "--backends", nargs="+", default=["onnx"],
+        choices=[name for name in BACKEND_NAMES if name != "keras"],
+    )
+    parser.add_argument("--min-agreement", type=float, default=1.0,
+                        help="required top-1 agreement with Keras (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--report", help="write the comparison as JSON to this file")
+    args = parser.parse_args()
+
+    cancer_type = cancer_types_by_key[args.cancer_type]
+    report = compare_backends(cancer_type, args.folder, args.backends, num_threads=args.threads)
+    print_report(cancer_type, report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({cancer_type.key: report}, f, indent=2)
+
+    failed = [name for name, row in report.items() if row["top1_agreement_with_keras"] < args.min_agreement]
+    if failed:
+        print(f"Top-1 labels differ from Keras for: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
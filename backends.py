@@ -0,0 +1,199 @@
+"""Inference engines that can run the organ models.
+
+The engine is chosen with ``MEDICT_BACKEND``:
+
+- ``keras`` (default): the original ``.h5`` models through TensorFlow.
+- ``tflite-dynamic`` / ``tflite-int8``: models converted by
+  ``export_tflite.py``, run by the TFLite interpreter.
+- ``onnx``: models converted by ``export_onnx.py``, run by ONNX Runtime.
+  TensorFlow is not imported at all with this engine.
+
+``MEDICT_NUM_THREADS`` sets the CPU threads used for each operator (default:
+let the runtime decide). ``MEDICT_INTER_OP_THREADS`` sets how many operators
+ONNX Runtime and TensorFlow may run in parallel.
+"""
+import os
+import threading
+
+import numpy as np
+
+import multihead
+from model_registry import configure_threads, get_model
+
+
+def _threads_from_env(name):
+    return int(os.environ.get(name, "0")) or None
+
+
+def tflite_path(model_path, variant):
+    return f"{os.path.splitext(model_path)[0]}_{variant}.tflite"
+
+
+def onnx_path(model_path):
+    return f"{os.path.splitext(model_path)[0]}.onnx"
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, num_threads=None, inter_op_threads=None):
+        if num_threads or inter_op_threads:
+            configure_threads(num_threads or 0, inter_op_threads or 0)
+
+    def model_file(self, cancer_type, model_path=None):
+        # The merged multi-organ model is preferred unless a specific model
+        # file was requested or the organ's model changed since it was built.
+        if (model_path is None and multihead.is_available()
+                and multihead.head_is_current(cancer_type.key, cancer_type.model_path)
+                and multihead.has_head(cancer_type.key)):
+            return multihead.MULTIHEAD_MODEL_PATH
+        return model_path or cancer_type.model_path
+
+    def predict(self, batch, cancer_type, model_path=None):
+        path = self.model_file(cancer_type, model_path)
+        if path == multihead.MULTIHEAD_MODEL_PATH:
+            return multihead.predict_all(batch, path)[cancer_type.key]
+        return np.asarray(get_model(path).predict_on_batch(batch))
+
+
+class TFLiteModel:
+    """A TFLite interpreter that accepts float batches of any size.
+
+    Quantized inputs and outputs are converted with the scale and zero point
+    stored in the model, so int8 models are drop-in replacements.
+    """
+
+    def __init__(self, path, num_threads=None, xnnpack=True):
+        try:
+            from tflite_runtime.interpreter import Interpreter, OpResolverType
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+            OpResolverType = tf.lite.experimental.OpResolverType
+        options = {}
+        if not xnnpack:
+            # XNNPACK repacks the weights into private memory; without it
+            # the kernels read them in place from the memory-mapped file,
+            # which every process serving the same file shares.
+            options["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads, **options)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input["shape"][0])
+        # Interpreters are not thread-safe; sessions take turns
+        self.lock = threading.Lock()
+
+    def predict(self, batch):
+        with self.lock:
+            if len(batch) != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input["index"], [len(batch), *batch.shape[1:]])
+                self.interpreter.allocate_tensors()
+                self.batch_size = len(batch)
+            self.interpreter.set_tensor(self.input["index"], _quantize(batch, self.input))
+            self.interpreter.invoke()
+            return _dequantize(self.interpreter.get_tensor(self.output["index"]), self.output)
+
+
+def _quantize(batch, details):
+    dtype = details["dtype"]
+    if not np.issubdtype(dtype, np.integer):
+        return batch.astype(dtype, copy=False)
+    scale, zero_point = details["quantization"]
+    info = np.iinfo(dtype)
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def _dequantize(output, details):
+    if not np.issubdtype(output.dtype, np.integer):
+        return output.astype(np.float32, copy=False)
+    scale, zero_point = details["quantization"]
+    return (output.astype(np.float32) - zero_point) * scale
+
+
+class TFLiteBackend:
+    def __init__(self, variant="int8", num_threads=None, xnnpack=None):
+        self.variant = variant
+        self.name = f"tflite-{variant}"
+        self.num_threads = num_threads
+        if xnnpack is None:
+            xnnpack = os.environ.get("MEDICT_TFLITE_XNNPACK", "1").lower() not in ("0", "false", "no")
+        self.xnnpack = xnnpack
+
+    def model_file(self, cancer_type, model_path=None):
+        return tflite_path(model_path or cancer_type.model_path, self.variant)
+
+    def predict(self, batch, cancer_type, model_path=None):
+        path = self.model_file(cancer_type, model_path)
+        model = get_model(path, loader=lambda p: TFLiteModel(p, self.num_threads, self.xnnpack))
+        return model.predict(batch)
+
+
+class OnnxModel:
+    def __init__(self, path, num_threads=None, inter_op_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        if inter_op_threads:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+            options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        # InferenceSession.run is thread-safe, no lock needed
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, num_threads=None, inter_op_threads=None):
+        self.num_threads = num_threads
+        self.inter_op_threads = inter_op_threads
+
+    def model_file(self, cancer_type, model_path=None):
+        return onnx_path(model_path or cancer_type.model_path)
+
+    def predict(self, batch, cancer_type, model_path=None):
+        path = self.model_file(cancer_type, model_path)
+        model = get_model(path, loader=lambda p: OnnxModel(p, self.num_threads, self.inter_op_threads))
+        return model.predict(batch)
+
+
+BACKEND_NAMES = ("keras", "tflite-dynamic", "tflite-int8", "onnx")
+
+
+def create_backend(spec, num_threads=None, inter_op_threads=None):
+    """Build a backend from one of ``BACKEND_NAMES``."""
+    if spec not in BACKEND_NAMES:
+        raise ValueError(f"Unknown backend {spec!r}; expected one of {', '.join(BACKEND_NAMES)}")
+    name, _, variant = spec.partition("-")
+    if name == "keras":
+        return KerasBackend(num_threads, inter_op_threads)
+    if name == "tflite":
+        return TFLiteBackend(variant, num_threads)
+    return OnnxBackend(num_threads, inter_op_threads)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = create_backend(
+            os.environ.get("MEDICT_BACKEND", "keras"),
+            _threads_from_env("MEDICT_NUM_THREADS"),
+            _threads_from_env("MEDICT_INTER_OP_THREADS"),
+        )
+    return _backend
+
+
+def set_backend(spec, num_threads=None, inter_op_threads=None):
+    global _backend
+    _backend = create_backend(spec, num_threads, inter_op_threads)
+    return _backend
@@ -0,0 +1,238 @@
+"""Benchmark inference for every organ model and inference engine.
+
+Each (organ, engine) case runs in a fresh Python process so that cold-start
+time and peak RSS are not flattered by models loaded by earlier cases. A
+case measures:
+
+- cold start: the first prediction, including loading the model
+- warm latency of one image (``kidney.jpeg``): p50/p95/p99 over ``--repeats`` runs
+- throughput in images/s for each ``--batch-sizes`` entry, on images from ``Testing/``
+- warm latency of one image with K test-time augmentation views for each ``--tta``
+  entry, and its ratio to the latency without augmentation
+- peak RSS of the process
+
+Results are written as JSON together with the commit and library versions.
+``--compare`` checks them against an earlier run and exits with status 1
+when warm latency or throughput is worse by more than ``--tolerance``.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --backends keras tflite-int8 --output new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from importlib import metadata
+
+import numpy as np
+
+import memstats
+from backends import BACKEND_NAMES, set_backend
+from cancer_types import cancer_types_by_key
+from inference import predict_probabilities
+from model_registry import registry
+from preprocessing import load_image
+from score_images import iter_source_batches
+
+SAMPLE_IMAGE = "kidney.jpeg"
+SAMPLE_FOLDER = "Testing"
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+TTA_VIEWS = (2, 4, 8)
+
+
+def _percentiles(seconds):
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000.0, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def _sample_batch(size):
+    """Up to ``size`` preprocessed images from ``SAMPLE_FOLDER``, repeated if there are fewer."""
+    _, batch = next(iter_source_batches(SAMPLE_FOLDER, size, workers=0))
+    return np.resize(batch, (size, *batch.shape[1:]))
+
+
+def _latencies(image, cancer_type, repeats, tta_views=1):
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_probabilities(image, cancer_type, cancer_type.model_path, tta_views)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def run_case(cancer_type, backend_name, batch_sizes=BATCH_SIZES, repeats=20, min_seconds=2.0, threads=None,
+             tta_views=TTA_VIEWS):
+    """Benchmark one organ model on one engine in this process."""
+    backend = set_backend(backend_name, threads)
+    model_path = backend.model_file(cancer_type, cancer_type.model_path)
+    image = load_image(SAMPLE_IMAGE)[None]
+
+    start = time.perf_counter()
+    predict_probabilities(image, cancer_type, cancer_type.model_path, 1)
+    cold_start = time.perf_counter() - start
+    load_seconds = registry.stats().get(model_path, {}).get("load_seconds")
+
+    latencies = _percentiles(_latencies(image, cancer_type, repeats))
+
+    tta_latency = {}
+    for views in tta_views:
+        # Untimed: the first pass of a new batch shape
+        predict_probabilities(image, cancer_type, cancer_type.model_path, views)
+        tta_latency[str(views)] = _percentiles(_latencies(image, cancer_type, repeats, views))
+        tta_latency[str(views)]["p50_vs_single_view"] = tta_latency[str(views)]["p50"] / latencies["p50"]
+
+    throughput = {}
+    samples = _sample_batch(max(batch_sizes))
+    for batch_size in batch_sizes:
+        batch = samples[:batch_size]
+        # One untimed pass lets the engine adapt to the new batch shape
+        predict_probabilities(batch, cancer_type, cancer_type.model_path, 1)
+        runs, start = 0, time.perf_counter()
+        while runs < 3 or time.perf_counter() - start < min_seconds:
+            predict_probabilities(batch, cancer_type, cancer_type.model_path, 1)
+            runs += 1
+        throughput[str(batch_size)] = runs * batch_size / (time.perf_counter() - start)
+
+    return {
+        "cancer_type": cancer_type.key,
+        "backend": backend_name,
+        "model": model_path,
+        "cold_start_seconds": cold_start,
+        "model_load_seconds": load_seconds,
+        "warm_latency_ms": latencies,
+        "tta_latency_ms": tta_latency,
+        "throughput_images_per_second": throughput,
+        "peak_rss_bytes": memstats.peak_rss_bytes(),
+    }
+
+
+def run_isolated(cancer_key, backend_name, args):
+    """Run one case in a child process; returns its result or an error entry."""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--case", f"{cancer_key}:{backend_name}",
+        "--batch-sizes", *map(str, args.batch_sizes), "--repeats", str(args.repeats),
+        "--min-seconds", str(args.min_seconds), "--threads", str(args.threads), "--tta", *map(str, args.tta),
+    ]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        message = completed.stderr.strip().splitlines()[-1:] or [f"exit status {completed.returncode}"]
+        return {"cancer_type": cancer_key, "backend": backend_name, "error": message[0]}
+    return json.loads(completed.stdout)
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    versions = {"python": platform.python_version(), "numpy": np.__version__}
+    for distribution in ("tensorflow", "tensorflow-cpu", "onnxruntime", "tflite-runtime"):
+        try:
+            versions[distribution] = metadata.version(distribution)
+        except metadata.PackageNotFoundError:
+            pass
+    return {
+        "commit": commit,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return descriptions of cases that got slower than ``baseline``."""
+    previous = {(r["cancer_type"], r["backend"]): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for result in results:
+        old = previous.get((result["cancer_type"], result["backend"]))
+        if old is None or "error" in result:
+            continue
+        case = f"{result['cancer_type']}/{result['backend']}"
+        new_p50, old_p50 = result["warm_latency_ms"]["p50"], old["warm_latency_ms"]["p50"]
+        if new_p50 > old_p50 * (1 + tolerance):
+            regressions.append(f"{case}: warm p50 {old_p50:.1f} -> {new_p50:.1f} ms")
+        for views, new in result.get("tta_latency_ms", {}).items():
+            old_tta = old.get("tta_latency_ms", {}).get(views)
+            if old_tta and new["p50"] > old_tta["p50"] * (1 + tolerance):
+                regressions.append(f"{case}: {views} TTA views p50 {old_tta['p50']:.1f} -> {new['p50']:.1f} ms")
+        for batch_size, new in result["throughput_images_per_second"].items():
+            old_rate = old["throughput_images_per_second"].get(batch_size)
+            if old_rate and new < old_rate * (1 - tolerance):
+                regressions.append(f"{case}: batch {batch_size} {old_rate:.1f} -> {new:.1f} images/s")
+    return regressions
+
+
+def print_results(results):
+    for r in results:
+        case = f"{r['cancer_type']:6} {r['backend']:15}"
+        if "error" in r:
+            print(f"{case} skipped: {r['error']}")
+            continue
+        latency = r["warm_latency_ms"]
+        best = max(r["throughput_images_per_second"].items(), key=lambda item: item[1])
+        print(f"{case} cold {r['cold_start_seconds']:6.2f}s  "
+              f"warm p50/p95/p99 {latency['p50']:.1f}/{latency['p95']:.1f}/{latency['p99']:.1f} ms  "
+              f"best {best[1]:.1f} images/s at batch {best[0]}  "
+              f"peak RSS {memstats.format_bytes(r['peak_rss_bytes'])}")
+        if r.get("tta_latency_ms"):
+            print(f"{'':22} TTA p50 " + "  ".join(
+                f"{views} views {stats['p50']:.1f} ms ({stats['p50_vs_single_view']:.2f}x)"
+                for views, stats in r["tta_latency_ms"].items()
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-c", "--cancer-types", nargs="+", choices=list(cancer_types_by_key),
+                        default=list(cancer_types_by_key))
+    parser.add_argument("--backends", nargs="+", choices=BACKEND_NAMES, default=["keras"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=list(BATCH_SIZES))
+    parser.add_argument("--repeats", type=int, default=20, help="timed single-image predictions")
+    parser.add_argument("--min-seconds", type=float, default=2.0,
+                        help="minimum time spent on each batch size (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--tta", nargs="*", type=int, default=list(TTA_VIEWS), metavar="K",
+                        help="test-time augmentation views to time; none to skip (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed slowdown vs --compare, as a fraction (default: %(default)s)")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        cancer_key, backend_name = args.case.split(":")
+        cancer_type = cancer_types_by_key[cancer_key]
+        result = run_case(cancer_type, backend_name, args.batch_sizes, args.repeats, args.min_seconds,
+                          args.threads or None, args.tta)
+        json.dump(result, sys.stdout)
+        return
+
+    results = []
+    for cancer_key in args.cancer_types:
+        for backend_name in args.backends:
+            print(f"Benchmarking {cancer_key} on {backend_name}...", file=sys.stderr)
+            results.append(run_isolated(cancer_key, backend_name, args))
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Slower than " + args.compare + ":\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
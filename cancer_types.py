@@ -0,0 +1,69 @@
+"""Cancer types served by the app, their labels, texts and model files.
+
+The definitions live in ``cancer_types.json`` (or the file named by
+``MEDICT_CANCER_TYPES``) and are loaded once per process, when this module
+is first imported. Adding an organ means adding an entry there: its key,
+display name, model file, input size, labels (in model output order), the
+label meaning "no finding", the CT window used for DICOM input, and the
+texts shown with each result.
+"""
+import json
+import os
+
+from preprocessing import INPUT_SIZE
+
+REGISTRY_PATH = os.environ.get(
+    "MEDICT_CANCER_TYPES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cancer_types.json")
+)
+
+
+class Cancer:
+    def __init__(
+        self,
+        key,
+        name,
+        model_path,
+        description,
+        labels,
+        true_positive_descriptions,
+        true_negative_description,
+        precautions,
+        normal_label=None,
+        input_size=INPUT_SIZE,
+        window=None,
+    ):
+        self.key = key
+        self.name = name
+        self.model_path = model_path
+        self.description = description
+        self.labels = labels
+        self.true_positive_descriptions = true_positive_descriptions
+        self.true_negative_description = true_negative_description
+        self.precautions = precautions
+        self.normal_label = normal_label
+        self.input_size = tuple(input_size)
+        # CT window/level preset in Hounsfield units, used for DICOM input
+        self.window = window
+
+    def is_normal(self, label):
+        return label == self.normal_label
+
+
+def load_cancer_types(path=REGISTRY_PATH):
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    loaded = []
+    for entry in entries:
+        entry = dict(entry, labels=dict(enumerate(entry["labels"])))
+        normal_label = entry.get("normal_label")
+        if normal_label is not None and normal_label not in entry["labels"].values():
+            raise ValueError(f"{path}: {entry['key']} normal_label {normal_label!r} is not a label")
+        if tuple(entry.get("input_size", INPUT_SIZE)) != INPUT_SIZE:
+            # Decoding and the batch buffers are built for one input size
+            raise ValueError(f"{path}: {entry['key']} input_size must be {list(INPUT_SIZE)}")
+        loaded.append(Cancer(**entry))
+    return loaded
+
+
+cancer_types = load_cancer_types()
+cancer_types_by_key = {cancer_type.key: cancer_type for cancer_type in cancer_types}
@@ -0,0 +1,362 @@
+"""Classify DICOM series (CT or MRI studies) slice by slice.
+
+Each file is first read up to its pixel data only, to group slices by
+series and sort them along the scan axis. Slices are then decoded one at a
+time, in batches of ``--batch-size``: uncompressed pixel data is memory-
+mapped straight from the file, compressed data is decoded by pydicom. A
+500-slice study therefore never sits in memory as a whole; only the current
+batch does.
+
+Stored values are converted to modality units (Hounsfield units for CT)
+with the rescale slope and intercept, then mapped to 8-bit grey levels with
+the window (``window`` in ``cancer_types.json``) of the selected organ.
+Series that are not CT, or organs without a window, use the window stored in
+the file, else each slice's own range.
+
+The per-slice predictions are combined into one result per series: mean and
+maximum probability per label, the slice where each label peaks, and a
+series label. The series label is the finding predicted on the most slices,
+as long as it is predicted on at least ``--min-slices`` of them; otherwise
+it is the normal label.
+
+Needs ``pydicom`` (``pip install pydicom``); compressed transfer syntaxes
+may also need the decoder packages pydicom asks for.
+
+Usage:
+    python dicom_series.py study/ -c kidney
+    python dicom_series.py study/ -c lung --batch-size 16 --output study.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from backends import BACKEND_NAMES, set_backend
+from cancer_types import cancer_types_by_key
+from inference import DEFAULT_BATCH_SIZE, predict_probabilities
+from preprocessing import batch_buffer, normalize, resize_image, timings
+
+DICOM_EXTENSIONS = (".dcm", ".dicom", ".ima")
+PIXEL_DATA = 0x7FE00010
+MIN_POSITIVE_SLICES = 3
+# Elements larger than this are not read until they are used
+DEFER_SIZE = 1024
+
+# One image of a series: frame ``frame`` of the file at ``path``
+Slice = namedtuple("Slice", ["path", "frame", "position"])
+
+
+def require_pydicom():
+    try:
+        import pydicom
+    except ImportError:
+        raise ImportError("DICOM input needs pydicom: pip install pydicom") from None
+    return pydicom
+
+
+def iter_dicom_paths(source):
+    """Yield the files of a study: ``source`` itself, or the files below it.
+
+    Files with a DICOM extension or none at all are candidates, since
+    scanners often write extensionless files; non-DICOM files are skipped
+    when their headers are read.
+    """
+    if os.path.isfile(source):
+        yield source
+        return
+    for dirpath, dirnames, filenames in os.walk(source):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            extension = os.path.splitext(filename)[1].lower()
+            if extension in DICOM_EXTENSIONS or not extension:
+                yield os.path.join(dirpath, filename)
+
+
+def _slice_position(header):
+    """Position along the slice normal, or the instance number when unknown."""
+    position = header.get("ImagePositionPatient")
+    orientation = header.get("ImageOrientationPatient")
+    if position is not None and orientation is not None and len(orientation) == 6:
+        normal = np.cross(np.asarray(orientation[:3], float), np.asarray(orientation[3:], float))
+        return float(np.dot(normal, np.asarray(position, float)))
+    return float(header.get("InstanceNumber") or 0)
+
+
+def find_series(paths):
+    """Group DICOM files by series; returns ``{series_uid: (header, slices)}``.
+
+    Only the headers are read. Slices are sorted along the scan axis, and
+    the header is that of the first file read, for series-wide attributes.
+    """
+    pydicom = require_pydicom()
+    series = {}
+    for path in paths:
+        try:
+            header = pydicom.dcmread(path, stop_before_pixels=True)
+        except (pydicom.errors.InvalidDicomError, OSError):
+            continue
+        if "Rows" not in header:
+            # Reports, presentation states and other objects without an image
+            continue
+        uid = str(header.get("SeriesInstanceUID", path))
+        _, slices = series.setdefault(uid, (header, []))
+        position = _slice_position(header)
+        frames = int(header.get("NumberOfFrames") or 1)
+        slices.extend(Slice(path, frame, position) for frame in range(frames))
+    for _, slices in series.values():
+        slices.sort(key=lambda s: (s.position, s.path, s.frame))
+    return series
+
+
+def _is_uncompressed(dataset):
+    syntax = getattr(dataset, "file_meta", {}).get("TransferSyntaxUID")
+    return syntax is not None and not syntax.is_compressed and syntax.is_little_endian
+
+
+def read_pixels(source):
+    """Return ``(dataset, frames)``, the stored values with the frames as the first axis.
+
+    For an uncompressed file on disk the array is a read-only memory map of
+    the pixel data, so nothing is read until a frame is used.
+    """
+    pydicom = require_pydicom()
+    start = time.perf_counter()
+    dataset = pydicom.dcmread(source, defer_size=DEFER_SIZE)
+    frames = int(dataset.get("NumberOfFrames") or 1)
+    shape = (frames, dataset.Rows, dataset.Columns)
+    pixels = None
+    if (isinstance(source, str) and _is_uncompressed(dataset) and dataset.get("SamplesPerPixel", 1) == 1
+            and dataset.BitsAllocated in (8, 16, 32)):
+        try:
+            element = dataset.get_item(PIXEL_DATA, keep_deferred=True)
+        except TypeError:
+            # pydicom 2 returns deferred elements unconverted
+            element = dataset.get_item(PIXEL_DATA)
+        dtype = np.dtype(f"<{'i' if dataset.PixelRepresentation else 'u'}{dataset.BitsAllocated // 8}")
+        if getattr(element, "value_tell", None) is not None and element.length == np.prod(shape) * dtype.itemsize:
+            pixels = np.memmap(source, dtype=dtype, mode="r", offset=element.value_tell, shape=shape)
+    if pixels is None:
+        pixels = dataset.pixel_array
+        if frames == 1:
+            pixels = pixels[None]
+    timings.add("decode", time.perf_counter() - start)
+    return dataset, pixels
+
+
+def _first(value):
+    """First value of a possibly multi-valued element."""
+    try:
+        return float(value[0])
+    except TypeError:
+        return float(value)
+
+
+def to_grey(frame, dataset, window=None):
+    """Map stored values to uint8 grey levels through rescale and window/level.
+
+    ``window`` is a ``{"center": ..., "width": ...}`` preset in modality
+    units, applied to CT only. Colour images (e.g. secondary captures) are
+    returned as they are.
+    """
+    if frame.ndim == 3:
+        return np.asarray(frame, dtype=np.uint8)
+    values = frame.astype(np.float32)
+    slope = float(dataset.get("RescaleSlope", 1) or 1)
+    intercept = float(dataset.get("RescaleIntercept", 0) or 0)
+    if slope != 1 or intercept != 0:
+        values = values * slope + intercept
+
+    if window is not None and dataset.get("Modality") == "CT":
+        center, width = window["center"], window["width"]
+    elif dataset.get("WindowCenter") is not None and dataset.get("WindowWidth") is not None:
+        center, width = _first(dataset.WindowCenter), _first(dataset.WindowWidth)
+    else:
+        low, high = float(values.min()), float(values.max())
+        center, width = (low + high) / 2, high - low
+    low = center - width / 2
+    grey = np.clip((values - low) * (255.0 / max(width, 1e-6)), 0, 255)
+    if dataset.get("PhotometricInterpretation") == "MONOCHROME1":
+        # Stored with white as the lowest value
+        grey = 255 - grey
+    return np.rint(grey).astype(np.uint8)
+
+
+def frame_pixels(frame, dataset, window=None):
+    """One frame as 350x350 RGB uint8 pixels, ready for ``normalize``."""
+    return resize_image(Image.fromarray(to_grey(frame, dataset, window)))
+
+
+def iter_slice_pixels(slices, window=None):
+    """Yield the pixels of each slice in order, reading one file at a time."""
+    path, dataset, frames = None, None, None
+    for item in slices:
+        if item.path != path:
+            path = item.path
+            dataset, frames = read_pixels(path)
+        yield frame_pixels(frames[item.frame], dataset, window)
+
+
+def iter_pixel_batches(pixels_iter, count, batch_size):
+    """Yield ``(start, batch)``: the next slices from ``start`` normalized into one batch.
+
+    The batch is this thread's reusable buffer, overwritten by the next one.
+    """
+    buffer = batch_buffer(min(batch_size, count))
+    start, row = 0, 0
+    for pixels in pixels_iter:
+        normalize(pixels, out=buffer[row])
+        row += 1
+        if row == len(buffer):
+            yield start, buffer
+            start, row = start + row, 0
+    if row:
+        yield start, buffer[:row]
+
+
+class SeriesAggregate:
+    """Running per-label statistics over the slices of one series."""
+
+    def __init__(self, cancer_type, min_slices=MIN_POSITIVE_SLICES):
+        self.cancer_type = cancer_type
+        self.min_slices = min_slices
+        n = len(cancer_type.labels)
+        self.slices = 0
+        self.sums = np.zeros(n)
+        self.maxima = np.zeros(n)
+        self.peak_slices = np.zeros(n, dtype=np.int64)
+        self.top_counts = np.zeros(n, dtype=np.int64)
+        self.slice_labels = []
+
+    def update(self, start, probabilities):
+        """Add the probabilities of slices ``start``, ``start + 1``, ..."""
+        top = probabilities.argmax(axis=1)
+        self.top_counts += np.bincount(top, minlength=len(self.sums))
+        self.sums += probabilities.sum(axis=0)
+        peaks = probabilities.max(axis=0)
+        improved = peaks > self.maxima
+        self.maxima[improved] = peaks[improved]
+        self.peak_slices[improved] = start + probabilities.argmax(axis=0)[improved]
+        self.slice_labels.extend(self.cancer_type.labels[int(i)] for i in top)
+        self.slices += len(probabilities)
+
+    def result(self):
+        labels = self.cancer_type.labels
+        means = self.sums / max(self.slices, 1)
+        normal = next((i for i in labels if self.cancer_type.is_normal(labels[i])), None)
+        findings = [i for i in labels if i != normal]
+        finding = max(findings, key=lambda i: (self.top_counts[i], self.maxima[i]), default=None)
+        # A finding reports its highest slice probability, "normal" its mean
+        if normal is None:
+            # Without a "no finding" label the most predicted label is reported
+            label, probability = labels[finding], float(self.maxima[finding])
+        else:
+            label, probability = labels[normal], float(means[normal])
+            if finding is not None and self.slices:
+                if self.top_counts[finding] >= min(self.min_slices, self.slices):
+                    label, probability = labels[finding], float(self.maxima[finding])
+        return {
+            "label": label,
+            "probability": probability,
+            "slices": self.slices,
+            "per_label": {
+                labels[i]: {
+                    "mean_probability": float(means[i]),
+                    "max_probability": float(self.maxima[i]),
+                    "peak_slice": int(self.peak_slices[i]),
+                    "slices_predicted": int(self.top_counts[i]),
+                }
+                for i in sorted(labels)
+            },
+            "slice_labels": self.slice_labels,
+        }
+
+
+def predict_series(slices, cancer_type, batch_size=DEFAULT_BATCH_SIZE, model_path=None,
+                   min_slices=MIN_POSITIVE_SLICES):
+    """Run one sorted series through batched inference and aggregate the slices."""
+    pixels = iter_slice_pixels(slices, cancer_type.window)
+    return _predict(pixels, len(slices), cancer_type, batch_size, model_path, min_slices)
+
+
+def _predict(pixels_iter, count, cancer_type, batch_size, model_path, min_slices):
+    aggregate = SeriesAggregate(cancer_type, min_slices)
+    for start, batch in iter_pixel_batches(pixels_iter, count, batch_size):
+        aggregate.update(start, predict_probabilities(batch, cancer_type, model_path))
+    return aggregate.result()
+
+
+def predict_study(source, cancer_type, batch_size=DEFAULT_BATCH_SIZE, model_path=None,
+                  min_slices=MIN_POSITIVE_SLICES):
+    """Classify every series in a file or folder; yields ``(series_uid, header, result)``."""
+    for uid, (header, slices) in find_series(iter_dicom_paths(source)).items():
+        yield uid, header, predict_series(slices, cancer_type, batch_size, model_path, min_slices)
+
+
+def preview(source, window=None):
+    """One DICOM file (path or file object) as a grey PIL image for display.
+
+    Multi-frame files show their middle frame.
+    """
+    dataset, frames = read_pixels(source)
+    return Image.fromarray(to_grey(frames[len(frames) // 2], dataset, window))
+
+
+def predict_file(source, cancer_type, batch_size=DEFAULT_BATCH_SIZE, model_path=None,
+                 min_slices=MIN_POSITIVE_SLICES):
+    """Classify one DICOM file (path or file object); its frames form one series."""
+    dataset, frames = read_pixels(source)
+    pixels = (frame_pixels(frame, dataset, cancer_type.window) for frame in frames)
+    return _predict(pixels, len(frames), cancer_type, batch_size, model_path, min_slices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("source", help="DICOM file or folder holding one or more series")
+    parser.add_argument("-c", "--cancer-type", required=True, choices=list(cancer_types_by_key))
+    parser.add_argument("--model", help="model file to use (default: the one the app uses)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument(
+        "--backend", default=os.environ.get("MEDICT_BACKEND", "keras"),
+        choices=BACKEND_NAMES, help="inference engine (default: %(default)s)",
+    )
+    parser.add_argument("--min-slices", type=int, default=MIN_POSITIVE_SLICES,
+                        help="slices a finding must be predicted on to label the series (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        require_pydicom()
+    except ImportError as e:
+        parser.exit(1, f"{e}\n")
+
+    set_backend(args.backend, args.threads or None)
+    cancer_type = cancer_types_by_key[args.cancer_type]
+    results = []
+    start = time.perf_counter()
+    for uid, header, result in predict_study(args.source, cancer_type, args.batch_size, args.model,
+                                             args.min_slices):
+        description = header.get("SeriesDescription") or uid
+        print(f"{description} ({header.get('Modality', '?')}, {result['slices']} slices): "
+              f"{result['label']} {result['probability']:.2f}")
+        for label, stats in result["per_label"].items():
+            print(f"  {label:26} mean {stats['mean_probability']:.3f}  max {stats['max_probability']:.3f} "
+                  f"(slice {stats['peak_slice']})  top on {stats['slices_predicted']} slices")
+        results.append(dict(result, series_uid=uid, series_description=str(description),
+                            modality=header.get("Modality")))
+    if not results:
+        parser.exit(1, f"No DICOM images found in {args.source}\n")
+    slices = sum(result["slices"] for result in results)
+    print(f"{slices} slices in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cancer_type": cancer_type.key, "series": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
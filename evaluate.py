@@ -0,0 +1,248 @@
+"""Measure model quality on a labelled test set such as ``Testing/``.
+
+Images stream through batched inference; the true class is given by each
+image's parent folder, as in ``Testing/<label>/``. Folders named after a
+label with a suffix, like the lung dataset's
+``adenocarcinoma_left.lower.lobe_T2_N0_M0_Ib``, match that label; others
+can be mapped with ``--label-map FOLDER=LABEL``. The report has accuracy,
+the confusion matrix, per-class precision/recall/F1, expected calibration
+error (ECE) and inference latency percentiles. Pass ``--baseline`` with an
+earlier report to fail (exit status 1) when accuracy or macro F1 drop, or
+ECE rises, by more than ``--max-drop``, or when one of them is missing from
+the new report, e.g. before swapping in new model files.
+
+``--tta K`` scores K augmented views of every image (see ``tta.py``).
+Comparing reports for several K against the one for ``--tta 1`` shows what
+the extra views buy in accuracy and calibration, and what they cost in
+latency.
+
+Usage:
+    python evaluate.py Testing -c brain --model ./models/Brain_Tumor.hdf5 --report old.json
+    python evaluate.py Testing -c brain --report new.json --baseline old.json
+    python evaluate.py Testing -c brain --tta 4 --report tta4.json --baseline new.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import tta
+from backends import BACKEND_NAMES, get_backend, set_backend
+from cancer_types import cancer_types_by_key
+from image_folders import FolderLabels, parse_label_map
+from inference import DEFAULT_BATCH_SIZE, predict_probabilities
+from score_images import iter_source_batches
+
+CALIBRATION_BINS = 15
+
+
+class Evaluation:
+    """Running confusion matrix and calibration histogram for one model."""
+
+    def __init__(self, labels, bins=CALIBRATION_BINS):
+        self.labels = list(labels)
+        self.bins = bins
+        self.confusion = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64)
+        self.bin_counts = np.zeros(bins, dtype=np.int64)
+        self.bin_confidence = np.zeros(bins)
+        self.bin_correct = np.zeros(bins)
+        self.unlabelled = 0
+
+    def update(self, truth, probabilities):
+        """Add a batch; ``truth`` holds class indices, or -1 for unknown folders."""
+        truth = np.asarray(truth)
+        labelled = truth >= 0
+        self.unlabelled += int((~labelled).sum())
+        truth, probabilities = truth[labelled], probabilities[labelled]
+        predicted = probabilities.argmax(axis=1)
+        n = len(self.labels)
+        self.confusion += np.bincount(truth * n + predicted, minlength=n * n).reshape(n, n)
+
+        confidence = probabilities.max(axis=1)
+        bin_ids = np.minimum((confidence * self.bins).astype(np.int64), self.bins - 1)
+        self.bin_counts += np.bincount(bin_ids, minlength=self.bins)
+        self.bin_confidence += np.bincount(bin_ids, weights=confidence, minlength=self.bins)
+        self.bin_correct += np.bincount(bin_ids, weights=predicted == truth, minlength=self.bins)
+
+    def report(self):
+        confusion = self.confusion
+        true_positives = np.diag(confusion).astype(np.float64)
+        support = confusion.sum(axis=1)
+        predicted = confusion.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.nan_to_num(true_positives / predicted)
+            recall = np.nan_to_num(true_positives / support)
+            f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+        total = int(support.sum())
+        # Macro averages only count classes that occur in the test set
+        present = support > 0
+
+        counts = np.maximum(self.bin_counts, 1)
+        gaps = np.abs(self.bin_correct / counts - self.bin_confidence / counts)
+        return {
+            "images": total + self.unlabelled,
+            "labelled_images": total,
+            "accuracy": float(true_positives.sum() / total) if total else None,
+            "macro": {
+                "precision": float(precision[present].mean()) if present.any() else None,
+                "recall": float(recall[present].mean()) if present.any() else None,
+                "f1": float(f1[present].mean()) if present.any() else None,
+            },
+            "per_class": {
+                label: {
+                    "precision": float(precision[i]),
+                    "recall": float(recall[i]),
+                    "f1": float(f1[i]),
+                    "support": int(support[i]),
+                }
+                for i, label in enumerate(self.labels)
+            },
+            "confusion_matrix": {"labels": self.labels, "rows_true_columns_predicted": confusion.tolist()},
+            "ece": float((self.bin_counts * gaps).sum() / total) if total else None,
+            "calibration_bins": [
+                {
+                    "count": int(self.bin_counts[i]),
+                    "mean_confidence": float(self.bin_confidence[i] / counts[i]),
+                    "accuracy": float(self.bin_correct[i] / counts[i]),
+                }
+                for i in range(self.bins)
+            ],
+        }
+
+
+def latency_summary(seconds):
+    milliseconds = np.asarray(seconds) * 1000.0
+    if not len(milliseconds):
+        return None
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"mean": float(milliseconds.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def evaluate(cancer_type, source, model_path=None, batch_size=DEFAULT_BATCH_SIZE, workers=None,
+             tta_views=None, label_map=None):
+    """Score every image in ``source`` and return the report as a dict."""
+    tta_views = tta.DEFAULT_VIEWS if tta_views is None else tta_views
+    labels = [cancer_type.labels[i] for i in sorted(cancer_type.labels)]
+    folder_labels = FolderLabels(labels, label_map)
+    evaluation = Evaluation(labels)
+    batch_seconds, image_seconds = [], []
+    start = time.perf_counter()
+    for paths, batch in iter_source_batches(source, batch_size, workers=workers):
+        predict_start = time.perf_counter()
+        probabilities = predict_probabilities(batch, cancer_type, model_path, tta_views)
+        elapsed = time.perf_counter() - predict_start
+        batch_seconds.append(elapsed)
+        image_seconds.extend([elapsed / len(paths)] * len(paths))
+        evaluation.update([folder_labels(path) for path in paths], probabilities)
+        print(f"\r{len(image_seconds)} images", end="", file=sys.stderr)
+    wall_seconds = time.perf_counter() - start
+    print(file=sys.stderr)
+
+    report = {
+        "cancer_type": cancer_type.key,
+        "source": str(source),
+        # The file actually scored, e.g. the merged model when model_path is None
+        "model": get_backend().model_file(cancer_type, model_path),
+        "batch_size": batch_size,
+        "tta_views": tta_views,
+    }
+    report.update(evaluation.report())
+    report["latency_ms"] = {
+        "per_batch": latency_summary(batch_seconds),
+        "per_image": latency_summary(image_seconds),
+    }
+    report["images_per_second"] = len(image_seconds) / wall_seconds if wall_seconds else None
+    return report
+
+
+def compare_to_baseline(report, baseline, max_drop):
+    """Return a list of metrics that got worse than ``baseline`` by more than ``max_drop``.
+
+    A metric the baseline has but the new report lacks counts as worse.
+    """
+    failures = []
+    # (name, current, previous, sign): sign is -1 where lower is better
+    for name, current, previous, sign in [
+        ("accuracy", report.get("accuracy"), baseline.get("accuracy"), 1),
+        ("macro F1", report.get("macro", {}).get("f1"), baseline.get("macro", {}).get("f1"), 1),
+        ("ECE", report.get("ece"), baseline.get("ece"), -1),
+    ]:
+        if previous is None:
+            continue
+        if current is None:
+            failures.append(f"{name} {previous:.2%} -> missing")
+        elif sign * (previous - current) > max_drop:
+            failures.append(f"{name} {previous:.2%} -> {current:.2%}")
+    return failures
+
+
+def print_report(report):
+    if report["accuracy"] is None:
+        print(f"{report['images']} images, none in a folder matching a {report['cancer_type']} label")
+        return
+    views = report.get("tta_views", 1)
+    augmented = f" ({views} TTA views each)" if views > 1 else ""
+    print(f"{report['labelled_images']} labelled images{augmented}: accuracy {report['accuracy']:.2%}, "
+          f"macro F1 {report['macro']['f1']:.3f}, ECE {report['ece']:.3f}")
+    for label, row in report["per_class"].items():
+        print(f"  {label:26} precision {row['precision']:.3f}  recall {row['recall']:.3f}  "
+              f"F1 {row['f1']:.3f}  ({row['support']} images)")
+    labels = report["confusion_matrix"]["labels"]
+    print("Confusion matrix (rows: true, columns: predicted)")
+    for label, row in zip(labels, report["confusion_matrix"]["rows_true_columns_predicted"]):
+        print(f"  {label:26} " + " ".join(f"{count:6d}" for count in row))
+    latency = report["latency_ms"]["per_image"]
+    print(f"Latency per image: p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, "
+          f"p99 {latency['p99']:.1f} ms ({report['images_per_second']:.1f} images/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("source", help="labelled image folder, packed dataset or split.json:<split>, e.g. Testing")
+    parser.add_argument("-c", "--cancer-type", required=True, choices=list(cancer_types_by_key))
+    parser.add_argument("--model", help="model file to evaluate (default: the one the app uses)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument(
+        "--backend", default=os.environ.get("MEDICT_BACKEND", "keras"),
+        choices=BACKEND_NAMES, help="inference engine (default: %(default)s)",
+    )
+    parser.add_argument("--tta", type=int, default=tta.DEFAULT_VIEWS, metavar="K",
+                        help=f"augmented views per image, 1 to {tta.MAX_VIEWS} (default: %(default)s)")
+    parser.add_argument("--label-map", nargs="+", metavar="FOLDER=LABEL",
+                        help="true label of class folders whose names do not match a label")
+    parser.add_argument("--report", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-drop", type=float, default=0.0,
+                        help="allowed drop in accuracy and macro F1 (or rise in ECE) vs --baseline "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+
+    cancer_type = cancer_types_by_key[args.cancer_type]
+    try:
+        label_map = parse_label_map(args.label_map)
+        FolderLabels(cancer_type.labels.values(), label_map)
+    except ValueError as e:
+        parser.error(str(e))
+    set_backend(args.backend, args.threads or None)
+    report = evaluate(cancer_type, args.source, args.model, args.batch_size, args.workers, args.tta, label_map)
+    report["backend"] = args.backend
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare_to_baseline(report, json.load(f), args.max_drop)
+        if failures:
+            print(f"Worse than {args.baseline}: {'; '.join(failures)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Convert the organ models to ONNX for the ONNX Runtime backend.
+
+Each ``<model>.h5`` is written as ``<model>.onnx`` with a dynamic batch
+dimension. Run ``backend_parity.py`` afterwards to check that the ONNX
+models give the same top-1 labels as Keras.
+
+Needs the packages in ``requirements-onnx.txt``. The model is traced as a
+``tf.function`` and converted with ``tf2onnx.convert.from_function``:
+``from_keras`` cannot map the output names of Keras 3 models.
+
+Usage:
+    pip install -r requirements-onnx.txt
+    python export_onnx.py --cancer-type brain
+    python backend_parity.py Testing --cancer-type brain --backends onnx
+"""
+import argparse
+
+from backends import onnx_path
+from cancer_types import cancer_types, cancer_types_by_key
+
+OPSET = 13
+
+
+def export(model_path, output_path, opset=OPSET):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(model_path)
+    signature = [tf.TensorSpec((None, *model.input_shape[1:]), tf.float32, name="image")]
+
+    @tf.function(input_signature=signature)
+    def forward(image):
+        return {"probabilities": model(image, training=False)}
+
+    tf2onnx.convert.from_function(forward, input_signature=signature, opset=opset, output_path=output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "-c", "--cancer-type", action="append", choices=list(cancer_types_by_key),
+        help="model(s) to convert; repeat for several (default: all)",
+    )
+    parser.add_argument("--opset", type=int, default=OPSET)
+    args = parser.parse_args()
+
+    for cancer_type in cancer_types:
+        if args.cancer_type and cancer_type.key not in args.cancer_type:
+            continue
+        output = onnx_path(cancer_type.model_path)
+        export(cancer_type.model_path, output, args.opset)
+        print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Convert the organ models to TFLite and report the accuracy cost.
+
+Two variants are written next to each ``.h5`` model:
+
+- ``<model>_dynamic.tflite``: dynamic-range quantization (int8 weights,
+  float activations); no calibration data needed.
+- ``<model>_int8.tflite``: full integer quantization, calibrated on images
+  sampled from ``--calibration-dir``.
+
+With ``--evaluate-dir`` every variant is compared against the Keras model
+on that folder and the accuracy deltas are printed and saved as JSON.
+
+Usage:
+    python export_tflite.py --cancer-type brain --calibration-dir Training \\
+        --evaluate-dir Testing --report tflite_report.json
+"""
+import argparse
+import json
+import random
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+from backend_parity import compare_backends, print_report
+from backends import tflite_path
+from cancer_types import cancer_types, cancer_types_by_key
+from image_folders import iter_source_paths
+from preprocessing import preprocess_image
+
+VARIANTS = ("dynamic", "int8")
+
+
+def representative_dataset(calibration_dir, num_samples, seed=0):
+    paths = list(iter_source_paths(calibration_dir))
+    # Sample across the whole tree so every class contributes to the ranges
+    paths = random.Random(seed).sample(paths, min(num_samples, len(paths)))
+
+    def generate():
+        for path in paths:
+            with Image.open(path) as image:
+                yield [preprocess_image(image)[np.newaxis]]
+
+    return generate
+
+
+def convert(model, variant, calibration_dir=None, num_samples=200):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "int8":
+        converter.representative_dataset = representative_dataset(calibration_dir, num_samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "-c", "--cancer-type", action="append", choices=list(cancer_types_by_key),
+        help="model(s) to convert; repeat for several (default: all)",
+    )
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument(
+        "--calibration-dir", default="Training",
+        help="images used to calibrate full int8 quantization (default: %(default)s)",
+    )
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--evaluate-dir", help="folder to compare TFLite and Keras results on")
+    parser.add_argument("--threads", type=int, default=None, help="TFLite interpreter threads")
+    parser.add_argument("--report", help="write the comparison as JSON to this file")
+    args = parser.parse_args()
+
+    selected = [c for c in cancer_types if not args.cancer_type or c.key in args.cancer_type]
+    reports = {}
+    for cancer_type in selected:
+        model = tf.keras.models.load_model(cancer_type.model_path)
+        for variant in args.variants:
+            output = tflite_path(cancer_type.model_path, variant)
+            with open(output, "wb") as f:
+                f.write(convert(model, variant, args.calibration_dir, args.calibration_samples))
+            print(f"Wrote {output}")
+        if args.evaluate_dir:
+            report = compare_backends(
+                cancer_type, args.evaluate_dir, [f"tflite-{v}" for v in args.variants],
+                num_threads=args.threads,
+            )
+            reports[cancer_type.key] = report
+            print_report(cancer_type, report)
+
+    if args.report and reports:
+        with open(args.report, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Precompute frozen VGG16 features once and retrain the heads from them.
+
+The notebooks freeze the VGG16 base (``vgg_model.layers[0].trainable =
+False``), yet every training epoch pushes every image through all 13 conv
+layers again. Since the base never changes, its 10x10x512 output for each
+image can be computed once and stored. Only the ``Flatten -> Dropout ->
+Dense`` head is then trained on those features, which takes seconds.
+
+Features are written to ``<prefix>.features.npy``, a float32 array opened
+memory-mapped, so the split never has to fit in RAM. ``<prefix>.index.json``
+records the image paths, labels and class names in the same order.
+
+With ``--cancer-type``, labels are numbered in the order of that cancer
+type's ``labels`` in ``cancer_types.json``, which is the order the app
+decodes model outputs in, rather than in alphabetical folder order. Class
+folders are matched to labels like in ``evaluate.py``. ``train`` refuses to
+save a full model whose classes are not in that order.
+
+Usage:
+    python feature_cache.py extract Training -c brain --output cache/brain_train \\
+        --from-model ./models/Brain_Tumor_2025_08_11.h5
+    python feature_cache.py extract Testing -c brain --output cache/brain_test \\
+        --from-model ./models/Brain_Tumor_2025_08_11.h5
+    python feature_cache.py train cache/brain_train -c brain --validation cache/brain_test \\
+        --from-model ./models/Brain_Tumor_2025_08_11.h5 --output ./models/Brain_Tumor_retrained.h5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from cancer_types import cancer_types_by_key
+from image_folders import FolderLabels, list_source_files
+from pack_dataset import PackedDataset, is_packed
+from prefetch import prefetch_batches
+from preprocessing import INPUT_SHAPE
+
+
+def load_backbone(from_model=None):
+    """The frozen VGG16 base of a saved organ model, or fresh ImageNet weights."""
+    import tensorflow as tf
+
+    if from_model:
+        return tf.keras.models.load_model(from_model).layers[0]
+    return tf.keras.applications.VGG16(weights="imagenet", include_top=False, input_shape=INPUT_SHAPE)
+
+
+def relabel(labels, class_names, target_names):
+    """Renumber ``labels`` from folder classes to ``target_names``.
+
+    Raises ``ValueError`` when a class folder matches none of the names.
+    """
+    matcher = FolderLabels(target_names)
+    mapping = [matcher.match(class_name) for class_name in class_names]
+    unmatched = [name for name, label in zip(class_names, mapping) if label < 0]
+    if unmatched:
+        raise ValueError(f"Class folders {', '.join(unmatched)} match none of {', '.join(target_names)}")
+    return [mapping[label] for label in labels], list(target_names)
+
+
+def extract_features(directory, output_prefix, backbone, batch_size=32, workers=None, label_names=None):
+    """Run ``backbone`` once over a class-per-folder tree (or a packed
+    dataset) and store the output.
+
+    ``label_names`` sets the class order, e.g. a cancer type's labels;
+    by default it is the alphabetical folder order.
+    """
+    if is_packed(directory):
+        packed = PackedDataset(directory)
+        paths, labels, class_names = packed.paths, packed.labels.tolist(), packed.class_names
+        batches = packed.iter_batches(batch_size)
+    else:
+        paths, labels, class_names = list_source_files(directory)
+        batches = prefetch_batches(paths, batch_size, workers)
+    if label_names is not None:
+        labels, class_names = relabel(labels, class_names, label_names)
+    feature_shape = tuple(backbone.output_shape[1:])
+    os.makedirs(os.path.dirname(output_prefix) or ".", exist_ok=True)
+    features = np.lib.format.open_memmap(
+        f"{output_prefix}.features.npy", mode="w+", dtype=np.float32, shape=(len(paths), *feature_shape)
+    )
+
+    kept = []
+    start = time.perf_counter()
+    for batch_paths, batch in batches:
+        features[len(kept):len(kept) + len(batch_paths)] = backbone.predict_on_batch(batch)
+        kept.extend(batch_paths)
+        print(f"\r{len(kept)}/{len(paths)} images", end="", file=sys.stderr)
+    features.flush()
+    print(f"\rExtracted {len(kept)} images in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    label_of = dict(zip(paths, labels))
+    index = {
+        "paths": kept,
+        "labels": [label_of[path] for path in kept],
+        "class_names": class_names,
+        "feature_shape": list(feature_shape),
+        # Unreadable images are skipped, so only the first rows are valid
+        "count": len(kept),
+    }
+    with open(f"{output_prefix}.index.json", "w") as f:
+        json.dump(index, f)
+    return index
+
+
+def load_features(prefix):
+    """Return ``(features, labels, index)``; features are memory-mapped."""
+    with open(f"{prefix}.index.json") as f:
+        index = json.load(f)
+    features = np.load(f"{prefix}.features.npy", mmap_mode="r")[:index["count"]]
+    return features, np.array(index["labels"]), index
+
+
+def build_head(feature_shape, num_classes, dropout=0.25):
+    """The notebooks' head: Flatten -> Dropout -> Dense(sigmoid)."""
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    head = tf.keras.Sequential([
+        tf.keras.Input(shape=feature_shape),
+        layers.Flatten(),
+        layers.Dropout(dropout),
+        layers.Dense(num_classes, activation="sigmoid"),
+    ])
+    head.compile(loss="categorical_crossentropy", optimizer="adam", metrics=["accuracy"])
+    return head
+
+
+def train_head(train_prefix, validation_prefix=None, epochs=32, batch_size=32):
+    import tensorflow as tf
+
+    features, labels, index = load_features(train_prefix)
+    num_classes = len(index["class_names"])
+    head = build_head(tuple(index["feature_shape"]), num_classes)
+    validation_data = None
+    if validation_prefix:
+        val_features, val_labels, _ = load_features(validation_prefix)
+        validation_data = (val_features, tf.one_hot(val_labels, num_classes))
+    head.fit(
+        features, tf.one_hot(labels, num_classes),
+        batch_size=batch_size, epochs=epochs, shuffle=True, validation_data=validation_data,
+    )
+    return head, index["class_names"]
+
+
+def assemble_model(backbone, head):
+    """Put a trained head back on the backbone, in the layout the app loads."""
+    import tensorflow as tf
+
+    backbone.trainable = False
+    model = tf.keras.Sequential([tf.keras.Input(shape=INPUT_SHAPE), backbone, *head.layers])
+    model.compile(loss="categorical_crossentropy", optimizer="adam", metrics=["accuracy"])
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="compute backbone features for an image tree")
+    extract.add_argument("directory", help="image tree, packed dataset or split.json:<split>")
+    extract.add_argument("--output", required=True, help="path prefix of the cache files")
+    extract.add_argument("-c", "--cancer-type", choices=list(cancer_types_by_key),
+                         help="number the classes in this cancer type's label order")
+    extract.add_argument("--from-model", help="take the backbone from this organ model (default: ImageNet VGG16)")
+    extract.add_argument("--batch-size", type=int, default=32)
+    extract.add_argument("--workers", type=int, default=None)
+
+    train = commands.add_parser("train", help="fit a head on cached features")
+    train.add_argument("features", help="path prefix written by extract")
+    train.add_argument("-c", "--cancer-type", choices=list(cancer_types_by_key),
+                       help="cancer type the model is for; required unless --head-only")
+    train.add_argument("--validation", help="path prefix of validation features")
+    train.add_argument("--epochs", type=int, default=32)
+    train.add_argument("--batch-size", type=int, default=32)
+    train.add_argument("--from-model", help="backbone to attach the head to when saving a full model")
+    train.add_argument("--output", required=True, help="where to save the model (.h5)")
+    train.add_argument("--head-only", action="store_true", help="save only the head, without the backbone")
+
+    args = parser.parse_args()
+    label_names = None
+    if args.cancer_type:
+        cancer_type = cancer_types_by_key[args.cancer_type]
+        label_names = [cancer_type.labels[i] for i in sorted(cancer_type.labels)]
+    if args.command == "extract":
+        try:
+            extract_features(args.directory, args.output, load_backbone(args.from_model), args.batch_size,
+                             args.workers, label_names)
+        except ValueError as e:
+            parser.exit(1, f"{e}\n")
+    else:
+        if not args.head_only:
+            if label_names is None:
+                parser.error("--cancer-type is required to save a full model")
+            # The app decodes outputs in the registry's label order
+            for prefix in filter(None, [args.features, args.validation]):
+                cached = load_features(prefix)[2]["class_names"]
+                if cached != label_names:
+                    parser.exit(1, f"{prefix} numbers its classes as {cached}, but the app expects "
+                                   f"{label_names}; extract it again with --cancer-type {args.cancer_type}\n")
+        head, class_names = train_head(args.features, args.validation, args.epochs, args.batch_size)
+        model = head if args.head_only else assemble_model(load_backbone(args.from_model), head)
+        model.save(args.output)
+        print(f"Saved {args.output}; class indices: {dict(enumerate(class_names))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Listing images in folder trees such as ``Training/`` and ``Testing/``,
+or in one split of a ``split_dataset.py`` manifest."""
+import json
+import os
+import re
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def iter_image_paths(root):
+    """Yield image paths under ``root`` in a stable, sorted order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+def list_class_files(directory, class_names=None):
+    """Return ``(paths, labels, class_names)`` for a class-per-folder tree."""
+    if class_names is None:
+        class_names = sorted(
+            entry.name for entry in os.scandir(directory) if entry.is_dir()
+        )
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(directory, class_name)
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, filename))
+                labels.append(label)
+    return paths, labels, list(class_names)
+
+
+SPLIT_FORMAT = "medict-split-v1"
+
+
+def parse_split_source(source):
+    """Return ``(manifest_path, split)`` for a ``split.json:test`` source, else ``None``."""
+    manifest_path, sep, split = str(source).rpartition(":")
+    if not sep or not manifest_path.endswith(".json") or os.sep in split or "/" in split:
+        return None
+    return manifest_path, split
+
+
+def read_split(manifest_path, split, class_names=None):
+    """Return ``(paths, labels, class_names)`` for one split of a split manifest."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SPLIT_FORMAT:
+        raise ValueError(f"{manifest_path} is not a {SPLIT_FORMAT} manifest")
+    if split not in manifest["splits"]:
+        raise ValueError(f"{manifest_path} has no {split!r} split; choose from {', '.join(manifest['splits'])}")
+    root = os.path.join(os.path.dirname(manifest_path), manifest["root"])
+    if class_names is None:
+        class_names = manifest["class_names"]
+    label_ids = {class_name: label for label, class_name in enumerate(class_names)}
+    paths, labels = [], []
+    for record in manifest["records"]:
+        if record["split"] == split and record["class"] in label_ids:
+            paths.append(os.path.normpath(os.path.join(root, record["path"])))
+            labels.append(label_ids[record["class"]])
+    return paths, labels, list(class_names)
+
+
+def list_source_files(source, class_names=None):
+    """``list_class_files`` for a folder tree or a ``split.json:<split>`` source."""
+    split_source = parse_split_source(source)
+    if split_source:
+        return read_split(*split_source, class_names=class_names)
+    return list_class_files(source, class_names)
+
+
+def iter_source_paths(source):
+    """``iter_image_paths`` for a folder tree or a ``split.json:<split>`` source."""
+    split_source = parse_split_source(source)
+    if split_source:
+        return iter(read_split(*split_source)[0])
+    return iter_image_paths(source)
+
+
+def _words(name):
+    return re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+
+
+class FolderLabels:
+    """Map an image path to the index of the label its class folder stands for.
+
+    A folder matches a label when their names are equal, or when the folder
+    name starts with the label's words, ignoring case and punctuation:
+    ``adenocarcinoma_left.lower.lobe_T2_N0_M0_Ib`` is ``Adenocarcinoma``.
+    The longest matching label wins. ``label_map`` (``{folder: label}``)
+    overrides the matching. Unmatched folders map to -1.
+    """
+
+    def __init__(self, labels, label_map=None):
+        self.labels = list(labels)
+        self.label_map = dict(label_map or {})
+        unknown = set(self.label_map.values()) - set(self.labels)
+        if unknown:
+            raise ValueError(f"Unknown labels {', '.join(sorted(unknown))}; expected {', '.join(self.labels)}")
+        self._folders = {}
+
+    def match(self, folder):
+        if folder in self.label_map:
+            return self.labels.index(self.label_map[folder])
+        if folder in self.labels:
+            return self.labels.index(folder)
+        words = _words(folder)
+        matches = [
+            (len(_words(label)), i) for i, label in enumerate(self.labels)
+            if words == _words(label) or words.startswith(_words(label) + " ")
+        ]
+        return max(matches)[1] if matches else -1
+
+    def __call__(self, path):
+        folder = os.path.basename(os.path.dirname(path))
+        label = self._folders.get(folder)
+        if label is None:
+            label = self._folders[folder] = self.match(folder)
+        return label
+
+
+def parse_label_map(items):
+    """``{folder: label}`` from ``FOLDER=LABEL`` command-line items."""
+    label_map = {}
+    for item in items or ():
+        folder, sep, label = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected FOLDER=LABEL, got {item!r}")
+        label_map[folder] = label
+    return label_map
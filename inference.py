@@ -0,0 +1,199 @@
+"""UI-free inference helpers shared by the Streamlit apps and the batch tools."""
+import io
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import metrics
+import model_registry
+import tta
+from backends import get_backend
+from preprocessing import (
+    INPUT_SHAPE, JPEG_DRAFT, batch_buffer, load_image, preprocess_batch, timings,
+)
+from result_cache import image_digest, model_id, prediction_cache
+
+# Part of the result cache key; bump whenever preprocessing changes its output
+PREPROCESSING_VERSION = 1
+DEFAULT_BATCH_SIZE = int(os.environ.get("MEDICT_BATCH_SIZE", "32"))
+
+logger = logging.getLogger(__name__)
+
+Prediction = namedtuple("Prediction", ["label", "probability", "probabilities"])
+
+
+def predict_probabilities(batch, cancer_type, model_path=None, tta_views=None):
+    """Run one forward pass over a preprocessed (N, 350, 350, 3) batch.
+
+    The engine is the backend configured in ``backends``; ``model_path``
+    overrides the model file of ``cancer_type``. With ``tta_views`` (default
+    ``MEDICT_TTA_VIEWS``) above 1, that many augmented views of every image
+    go through the same forward pass and their probabilities are averaged.
+    """
+    views = tta.DEFAULT_VIEWS if tta_views is None else tta_views
+    if views > 1:
+        batch = tta.expand_batch(batch, views)
+    start = time.perf_counter()
+    probabilities = get_backend().predict(batch, cancer_type, model_path)
+    timings.add("inference", time.perf_counter() - start)
+    if views > 1:
+        probabilities = tta.average_views(probabilities, views)
+    return probabilities
+
+
+def to_prediction(probabilities, cancer_type):
+    class_index = int(np.argmax(probabilities))
+    return Prediction(
+        cancer_type.labels[class_index], float(probabilities[class_index]), probabilities
+    )
+
+
+def predict_batch(images, cancer_type, batch_size=DEFAULT_BATCH_SIZE, model_path=None):
+    """Classify PIL images for one cancer type.
+
+    Images are preprocessed and stacked into batches of ``batch_size`` so the
+    model runs one forward pass per batch instead of one per image. Returns
+    one ``Prediction`` per image, in input order.
+    """
+    images = list(images)
+    results = []
+    buffer = batch_buffer(min(batch_size, len(images)))
+    for start in range(0, len(images), batch_size):
+        batch = preprocess_batch(images[start:start + batch_size], out=buffer)
+        probabilities = predict_probabilities(batch, cancer_type, model_path)
+        results.extend(to_prediction(p, cancer_type) for p in probabilities)
+    return results
+
+
+def warmup_batch_sizes(max_batch_size=DEFAULT_BATCH_SIZE):
+    """Batch sizes to run at startup: ``MEDICT_WARMUP_BATCH_SIZES`` if set.
+
+    Otherwise 1 and ``max_batch_size``, or with XLA every padded size up
+    to ``max_batch_size``, since each is compiled separately.
+    """
+    configured = os.environ.get("MEDICT_WARMUP_BATCH_SIZES")
+    if configured:
+        return sorted({int(size) for size in configured.split(",") if size.strip()})
+    if model_registry.XLA and get_backend().name == "keras":
+        return [1 << i for i in range(model_registry.padded_batch_size(max_batch_size).bit_length())]
+    return sorted({1, max_batch_size})
+
+
+_warmed_up = set()
+
+
+def warm_up(cancer_types, batch_sizes=(1,)):
+    """Load every model and run dummy batches through it.
+
+    The first forward pass of each batch shape pays for tracing, graph
+    building and (with XLA) compilation; doing it here keeps that cost off
+    the first real request. Models shared by several cancer types are only
+    run once, and repeated calls are no-ops. Returns seconds per model file.
+    With test-time augmentation the batches hold every view of the images.
+
+    With a model memory budget, warm-up stops as soon as loading a model
+    evicts one it warmed earlier: the rest would only evict each other.
+    """
+    backend = get_backend()
+    seconds = {}
+    for cancer_type in cancer_types:
+        path = backend.model_file(cancer_type)
+        evicted = [p for p in seconds if not model_registry.registry.is_loaded(p)]
+        if evicted:
+            logger.warning("The model memory budget cannot hold every model; %s was evicted, "
+                           "so %s and the models after it are loaded on first use", evicted[0], path)
+            break
+        for batch_size in (size * tta.DEFAULT_VIEWS for size in batch_sizes):
+            if (backend.name, path, batch_size) in _warmed_up:
+                continue
+            start = time.perf_counter()
+            # Straight to the backend so warm-up stays out of the stage timings
+            backend.predict(np.zeros((batch_size, *INPUT_SHAPE), dtype=np.float32), cancer_type)
+            seconds[path] = seconds.get(path, 0.0) + time.perf_counter() - start
+            _warmed_up.add((backend.name, path, batch_size))
+    return seconds
+
+
+class BackgroundWarmUp:
+    """Runs ``warm_up`` on a daemon thread so a UI can render meanwhile.
+
+    TensorFlow is imported by the first model load, so that import happens
+    on this thread too.
+    """
+
+    def __init__(self, cancer_types, batch_sizes=(1,)):
+        self.started = time.perf_counter()
+        self.ready_seconds = None
+        self.error = None
+        self._done = threading.Event()
+        threading.Thread(
+            target=self._run, args=(cancer_types, batch_sizes), name="warm-up", daemon=True
+        ).start()
+
+    def _run(self, cancer_types, batch_sizes):
+        try:
+            warm_up(cancer_types, batch_sizes)
+        except Exception as e:
+            # Predictions will load the models themselves and report the error
+            logger.exception("Warm-up failed")
+            self.error = e
+        finally:
+            self.ready_seconds = time.perf_counter() - self.started
+            logger.info("Models ready %.2fs after startup", self.ready_seconds)
+            metrics.observe("models_ready", self.ready_seconds)
+            self._done.set()
+
+    def is_ready(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+_background_warm_ups = {}
+_background_lock = threading.Lock()
+
+
+def warm_up_in_background(cancer_types, batch_sizes=(1,)):
+    """Start warming up ``cancer_types`` on the first call for them.
+
+    Later calls for the same cancer types return the same ``BackgroundWarmUp``.
+    """
+    key = (tuple(cancer_type.key for cancer_type in cancer_types), tuple(batch_sizes))
+    with _background_lock:
+        if key not in _background_warm_ups:
+            _background_warm_ups[key] = BackgroundWarmUp(cancer_types, batch_sizes)
+        return _background_warm_ups[key]
+
+
+def cache_key(data, cancer_type, model_path=None, draft=JPEG_DRAFT):
+    backend = get_backend()
+    version = f"{PREPROCESSING_VERSION}+draft" if draft else PREPROCESSING_VERSION
+    if tta.DEFAULT_VIEWS > 1:
+        version = f"{version}+tta{tta.DEFAULT_VIEWS}"
+    return (
+        image_digest(data),
+        model_id(backend.name, backend.model_file(cancer_type, model_path)),
+        version,
+        cancer_type.key,
+    )
+
+
+def predict_bytes(data, cancer_type, model_path=None, draft=JPEG_DRAFT):
+    """Classify an encoded image, reusing the cached result for known bytes.
+
+    A cache hit skips decoding, preprocessing and the forward pass.
+    """
+    key = cache_key(data, cancer_type, model_path, draft)
+    probabilities = prediction_cache.get(key) if prediction_cache.enabled else None
+    if probabilities is None:
+        batch = batch_buffer(1)
+        load_image(io.BytesIO(data), out=batch[0], draft=draft)
+        probabilities = predict_probabilities(batch, cancer_type, model_path)[0]
+        if prediction_cache.enabled:
+            prediction_cache.put(key, probabilities)
+    return to_prediction(probabilities, cancer_type)
@@ -0,0 +1,54 @@
+import os
+import resource
+import sys
+
+
+def rss_bytes():
+    """Current resident set size of this process, in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_bytes(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def memory_breakdown(pid="self"):
+    """Unique, shared and proportional set size of a process, in bytes.
+
+    ``unique`` is memory only this process maps (what killing it frees);
+    ``shared`` is also mapped by other processes, e.g. model weights
+    inherited copy-on-write from a parent or file pages mapped by several
+    workers. Returns ``None`` where ``/proc/<pid>/smaps_rollup`` is missing
+    (non-Linux, or kernels before 4.14).
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.read().splitlines()[1:]
+    except OSError:
+        return None
+    kb = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if value.strip().endswith("kB"):
+            kb[name] = int(value.split()[0])
+    return {
+        "rss": kb.get("Rss", 0) * 1024,
+        "pss": kb.get("Pss", 0) * 1024,
+        "unique": (kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0)) * 1024,
+        "shared": (kb.get("Shared_Clean", 0) + kb.get("Shared_Dirty", 0)) * 1024,
+    }
@@ -0,0 +1,178 @@
+"""Per-stage latency histograms in the Prometheus text format.
+
+Set ``MEDICT_METRICS=1`` to record how long each stage of a prediction
+takes (upload read, decode, resize, normalize, TTA, inference, render),
+plus the app's time to first paint and time until the models are ready.
+The Streamlit app then serves the histograms on
+``http://127.0.0.1:$MEDICT_METRICS_PORT/metrics`` (default port 9108) and
+``server.py`` on its own ``/metrics`` route. When disabled, ``timer()``
+returns a shared no-op context manager and nothing is recorded.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from a fast decode to a cold model load
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_NAME = "medict_stage_duration_seconds"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+enabled = os.environ.get("MEDICT_METRICS", "").lower() in ("1", "true", "yes")
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf overflow
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class StageHistograms:
+    """One histogram per stage name, safe to update from any thread."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {
+                    "count": h.count,
+                    "mean_ms": 1000 * h.sum / h.count,
+                    "p50_ms_at_most": 1000 * h.quantile(0.5),
+                    "p95_ms_at_most": 1000 * h.quantile(0.95),
+                }
+                for stage, h in self._histograms.items()
+            }
+
+    def render(self):
+        """The histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each stage of a prediction.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip([*map(repr, h.buckets), "+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {h.sum!r}')
+                lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+stages = StageHistograms()
+
+
+def observe(stage, seconds):
+    if enabled:
+        stages.observe(stage, seconds)
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        stages.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_no_timer = _NoTimer()
+
+
+def timer(stage):
+    """Context manager recording the duration of its block under ``stage``."""
+    return _Timer(stage) if enabled else _no_timer
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = stages.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_server(port=None, host="127.0.0.1"):
+    """Serve ``/metrics`` from a daemon thread; later calls are no-ops.
+
+    Streamlit re-runs the app script on every interaction, so the server is
+    kept at module level and only started once per process.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            port = port or int(os.environ.get("MEDICT_METRICS_PORT", "9108"))
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning("Cannot serve metrics on %s:%d: %s", host, port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
+
+
+def server_port():
+    return _server.server_address[1] if _server is not None else None
@@ -0,0 +1,201 @@
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import memstats
+
+logger = logging.getLogger(__name__)
+
+
+def _budget_from_env():
+    budget_mb = os.environ.get("MEDICT_MODEL_BUDGET_MB")
+    if not budget_mb:
+        return None
+    return int(float(budget_mb) * 1024 * 1024)
+
+
+# Compile Keras models with XLA behind a fixed input signature
+XLA = os.environ.get("MEDICT_XLA", "").lower() in ("1", "true", "yes")
+
+
+def load_keras_model(path):
+    # TensorFlow is imported on first use so that engines which do not need
+    # it (ONNX Runtime, tflite_runtime) can run without it installed.
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(path)
+    return CompiledModel(model) if XLA else model
+
+
+def padded_batch_size(n):
+    return 1 << (n - 1).bit_length()
+
+
+class CompiledModel:
+    """A Keras model run through one XLA-compiled ``tf.function``.
+
+    XLA compiles a program per input shape, so batches are zero-padded to
+    the next power of two: a server never compiles more than a handful of
+    shapes, and ``inference.warm_up`` can compile all of them up front.
+    """
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self.model = model
+        self._function = tf.function(
+            lambda batch: model(batch, training=False),
+            input_signature=[tf.TensorSpec((None, *model.input_shape[1:]), tf.float32)],
+            jit_compile=True,
+        )
+
+    def __getattr__(self, name):
+        # output_names, get_weights, ... come from the wrapped model
+        return getattr(self.model, name)
+
+    def predict_on_batch(self, batch):
+        n = len(batch)
+        size = padded_batch_size(n)
+        if size != n:
+            padded = np.zeros((size, *batch.shape[1:]), dtype=np.float32)
+            padded[:n] = batch
+            batch = padded
+        outputs = self._function(batch)
+        if isinstance(outputs, (list, tuple)):
+            return [np.asarray(output)[:n] for output in outputs]
+        return np.asarray(outputs)[:n]
+
+
+def _model_bytes(model, path):
+    if hasattr(model, "get_weights"):
+        return sum(w.nbytes for w in model.get_weights())
+    # Runtimes without a weights API keep roughly the model file in memory
+    return os.path.getsize(path)
+
+
+class ModelRegistry:
+    """Loads Keras models on first use and shares them between sessions.
+
+    Streamlit re-executes the app script on every interaction, but imported
+    modules stay in ``sys.modules``, so a registry living here survives reruns
+    and is shared by every browser session served by the same process.
+
+    When ``max_bytes`` is set, the least recently used models are evicted
+    once the combined size of their weights exceeds the budget. The model
+    that was just requested is never evicted, so a budget smaller than a
+    single model simply keeps one model resident.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._models = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, path, loader=None):
+        """Return the model stored at ``path``, loading it on first use.
+
+        ``loader`` turns a path into a model object and defaults to the Keras
+        loader; other runtimes pass their own so their models share the same
+        cache and memory budget.
+        """
+        with self._lock:
+            model = self._lookup(path)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(path, threading.Lock())
+
+        # Loads of different models can run side by side, but each model is
+        # only ever loaded by one session at a time.
+        with load_lock:
+            with self._lock:
+                model = self._lookup(path)
+                if model is not None:
+                    return model
+            model = self._load(path, loader or load_keras_model)
+            with self._lock:
+                self._models[path] = model
+                self._evict(keep=path)
+            return model
+
+    def _lookup(self, path):
+        model = self._models.get(path)
+        if model is not None:
+            self._models.move_to_end(path)
+            self._stats[path]["hits"] += 1
+        return model
+
+    def _load(self, path, loader):
+        rss_before = memstats.rss_bytes()
+        start = time.perf_counter()
+        model = loader(path)
+        load_seconds = time.perf_counter() - start
+        stats = self._stats.setdefault(path, {"loads": 0, "hits": 0, "evictions": 0})
+        stats.update(
+            loads=stats["loads"] + 1,
+            load_seconds=load_seconds,
+            rss_delta_bytes=memstats.rss_bytes() - rss_before,
+            weight_bytes=_model_bytes(model, path),
+        )
+        logger.info("Loaded %s in %.2fs", path, load_seconds)
+        return model
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+        evicted = False
+        for path in list(self._models):
+            if self.resident_bytes() <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            del self._models[path]
+            self._stats[path]["evictions"] += 1
+            evicted = True
+            logger.info("Evicted %s to stay within the model memory budget", path)
+        if evicted:
+            gc.collect()
+
+    def set_budget(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            if self._models:
+                self._evict(keep=next(reversed(self._models)))
+
+    def resident_bytes(self):
+        return sum(self._stats[path]["weight_bytes"] for path in self._models)
+
+    def is_loaded(self, path):
+        return path in self._models
+
+    def stats(self):
+        """Load time, memory and cache figures for every model seen so far."""
+        with self._lock:
+            return {
+                path: dict(stats, resident=path in self._models)
+                for path, stats in self._stats.items()
+            }
+
+
+registry = ModelRegistry(max_bytes=_budget_from_env())
+
+
+def configure_threads(intra_op=0, inter_op=0):
+    """Set TensorFlow's CPU thread pools; 0 lets TensorFlow pick.
+
+    Must be called before the first model is loaded.
+    """
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+
+def get_model(path, loader=None):
+    return registry.get(path, loader)
@@ -0,0 +1,220 @@
+"""Merge the lung, kidney and brain models into one shared-backbone model.
+
+All three notebooks train the same frozen ImageNet VGG16 base with a small
+``Flatten -> Dropout -> Dense(4)`` head on top, so the convolutional weights
+are identical between the three saved models. This script keeps one copy of
+the backbone and attaches the three heads to it, which cuts resident memory
+roughly threefold and lets one forward pass score an image for every organ.
+
+The size and SHA-256 of every source model are stored in the merged file.
+A head is only used while the organ's model file still matches them, so a
+retrained or replaced per-organ model is served as soon as it is in place,
+instead of a stale head; rebuild the merged model to share its backbone
+again.
+
+Usage:
+    python multihead.py --output ./models/MultiOrgan_2025_08_11.h5
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from cancer_types import cancer_types_by_key
+from model_registry import get_model
+
+ORGANS = tuple(cancer_types_by_key)
+
+DEFAULT_MODEL_PATHS = {key: cancer_type.model_path for key, cancer_type in cancer_types_by_key.items()}
+
+MULTIHEAD_MODEL_PATH = os.environ.get(
+    "MEDICT_MULTIHEAD_MODEL", "./models/MultiOrgan_2025_08_11.h5"
+)
+# HDF5 attribute of the merged file holding the source model fingerprints
+SOURCES_ATTR = "medict_sources"
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return {"size": os.path.getsize(path), "sha256": sha256.hexdigest()}
+
+
+def read_sources(path=MULTIHEAD_MODEL_PATH):
+    """The ``{organ: fingerprint}`` recorded in a merged model, or ``{}``."""
+    import h5py
+
+    with h5py.File(path, "r") as f:
+        sources = f.attrs.get(SOURCES_ATTR)
+    return json.loads(sources) if sources is not None else {}
+
+
+def read_output_names(path=MULTIHEAD_MODEL_PATH):
+    """Output names of a saved merged model, read from its config without loading it."""
+    import h5py
+
+    with h5py.File(path, "r") as f:
+        config = json.loads(f.attrs["model_config"])
+    return [layer[0] for layer in config["config"]["output_layers"]]
+
+
+def write_sources(path, source_paths):
+    import h5py
+
+    sources = {organ: fingerprint(source) for organ, source in source_paths.items()}
+    with h5py.File(path, "a") as f:
+        f.attrs[SOURCES_ATTR] = json.dumps(sources)
+
+
+_head_checks = {}
+_output_names = {}
+_head_checks_lock = threading.Lock()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def head_is_current(organ, source_path, path=MULTIHEAD_MODEL_PATH):
+    """Whether the merged head for ``organ`` was built from ``source_path`` as it is now.
+
+    Files are only hashed again when their size or modification time
+    changes. Merged models without fingerprints are never trusted.
+    """
+    try:
+        key = (_stat_key(path), _stat_key(source_path))
+    except FileNotFoundError:
+        # Without the per-organ file the merged head is all there is
+        return os.path.exists(path)
+    with _head_checks_lock:
+        cached = _head_checks.get((path, organ, source_path))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        recorded = read_sources(path).get(organ)
+        current = recorded is not None and recorded == fingerprint(source_path)
+        if not current:
+            logger.warning(
+                "%s was not built from the current %s; using that file for %s until the merged model is rebuilt",
+                path, source_path, organ,
+            )
+        _head_checks[(path, organ, source_path)] = (key, current)
+        return current
+
+
+def _check_same_backbone(reference, backbone, organ):
+    ref_weights = reference.get_weights()
+    weights = backbone.get_weights()
+    if len(ref_weights) != len(weights) or not all(
+        np.array_equal(a, b) for a, b in zip(ref_weights, weights)
+    ):
+        raise ValueError(
+            f"The {organ} model does not share the backbone weights of the other "
+            "models; it was probably fine-tuned and cannot be merged."
+        )
+
+
+def build_multihead_model(organ_models):
+    """Build one model with a shared backbone and one output per organ.
+
+    ``organ_models`` maps organ names to the per-organ Sequential models saved
+    by the notebooks, whose first layer is the frozen VGG16 base.
+    """
+    import tensorflow as tf
+
+    organs = list(organ_models)
+    backbone = organ_models[organs[0]].layers[0]
+    for organ in organs[1:]:
+        _check_same_backbone(backbone, organ_models[organ].layers[0], organ)
+
+    inputs = tf.keras.Input(shape=backbone.input_shape[1:], name="image")
+    features = backbone(inputs)
+    outputs = [
+        tf.keras.Sequential(organ_models[organ].layers[1:], name=organ)(features)
+        for organ in organs
+    ]
+    return tf.keras.Model(inputs, outputs, name="multi_organ_vgg16")
+
+
+def is_available(path=MULTIHEAD_MODEL_PATH):
+    return os.path.exists(path)
+
+
+def has_head(organ, path=MULTIHEAD_MODEL_PATH):
+    """Whether the merged model has an output for ``organ``.
+
+    Organs added to ``cancer_types.json`` after the merged model was built
+    keep using their own model file. The names are read from the file, so
+    this never loads the model, and only again when the file changes.
+    """
+    try:
+        key = _stat_key(path)
+    except FileNotFoundError:
+        return False
+    with _head_checks_lock:
+        cached = _output_names.get(path)
+        if cached is None or cached[0] != key:
+            cached = (key, read_output_names(path))
+            _output_names[path] = cached
+    return organ in cached[1]
+
+
+def predict_all(batch, path=MULTIHEAD_MODEL_PATH):
+    """Run one backbone pass and return ``{organ: probabilities}`` per head.
+
+    ``batch`` is a preprocessed float array of shape (N, 350, 350, 3); each
+    returned array has shape (N, num_classes).
+    """
+    model = get_model(path)
+    outputs = model.predict_on_batch(batch)
+    if not isinstance(outputs, (list, tuple)):
+        outputs = [outputs]
+    return dict(zip(model.output_names, outputs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    for organ in ORGANS:
+        parser.add_argument(
+            f"--{organ}",
+            default=DEFAULT_MODEL_PATHS[organ],
+            help=f"path of the {organ} model (default: %(default)s)",
+        )
+    parser.add_argument(
+        "--output",
+        default=MULTIHEAD_MODEL_PATH,
+        help="where to write the merged model (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    organ_models = {
+        organ: tf.keras.models.load_model(getattr(args, organ)) for organ in ORGANS
+    }
+    model = build_multihead_model(organ_models)
+
+    # Sanity check: every head must reproduce its source model exactly
+    probe = np.random.default_rng(0).random((2, *model.input_shape[1:]), dtype=np.float32)
+    merged = dict(zip(model.output_names, model.predict(probe, verbose=0)))
+    for organ, source in organ_models.items():
+        np.testing.assert_allclose(merged[organ], source.predict(probe, verbose=0), rtol=1e-5, atol=1e-6)
+
+    model.save(args.output)
+    write_sources(args.output, {organ: getattr(args, organ) for organ in ORGANS})
+    weights = sum(w.nbytes for w in model.get_weights())
+    separate = sum(w.nbytes for m in organ_models.values() for w in m.get_weights())
+    print(f"Saved {args.output}: {weights / 2**20:.1f} MB of weights "
+          f"(separate models: {separate / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
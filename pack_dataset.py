@@ -0,0 +1,152 @@
+"""Pack a class-per-folder image tree into memory-mapped uint8 shards.
+
+Listing, opening and decoding thousands of small JPEGs dominates data
+loading, especially on network filesystems. This tool decodes every image
+once, resized to 350x350 exactly like the app does, and stores the pixels
+in ``.npy`` shards of ``--shard-size`` images plus a ``manifest.json``
+index. Readers memory-map the shards and slice them without copying.
+
+Usage:
+    python pack_dataset.py Training packed/Training
+    python score_images.py packed/Training/manifest.json -c brain -o training.csv
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from image_folders import list_source_files
+from preprocessing import INPUT_SHAPE, batch_buffer, decode_image, normalize
+
+FORMAT = "medict-packed-v1"
+MANIFEST = "manifest.json"
+
+
+def _decode(path):
+    try:
+        return decode_image(path, draft=False)
+    except (OSError, UnidentifiedImageError) as e:
+        print(f"Skipping {path}: {e}", file=sys.stderr)
+        return None
+
+
+def pack(directory, output_dir, shard_size=1024, workers=None):
+    """Decode ``directory`` into shards under ``output_dir``; returns the manifest."""
+    paths, labels, class_names = list_source_files(directory)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {
+        "format": FORMAT,
+        "image_shape": list(INPUT_SHAPE),
+        "dtype": "uint8",
+        "class_names": class_names,
+        "shards": [],
+        "records": [],
+    }
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for first in range(0, len(paths), shard_size):
+            chunk = range(first, min(first + shard_size, len(paths)))
+            filename = f"shard-{len(manifest['shards']):05d}.npy"
+            shard = np.lib.format.open_memmap(
+                os.path.join(output_dir, filename), mode="w+", dtype=np.uint8,
+                shape=(len(chunk), *INPUT_SHAPE),
+            )
+            count = 0
+            for i, pixels in zip(chunk, pool.map(_decode, [paths[i] for i in chunk])):
+                if pixels is None:
+                    continue
+                shard[count] = pixels
+                manifest["records"].append({"path": paths[i], "label": labels[i]})
+                count += 1
+            shard.flush()
+            del shard
+            # Rows past ``count`` (skipped images) are never read
+            manifest["shards"].append({"file": filename, "count": count})
+            print(f"\r{len(manifest['records'])}/{len(paths)} images packed", end="", file=sys.stderr)
+    with open(os.path.join(output_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f)
+    print(f"\rPacked {len(manifest['records'])} images into {len(manifest['shards'])} shards "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return manifest
+
+
+def is_packed(source):
+    return os.path.basename(source) == MANIFEST or os.path.isfile(os.path.join(source, MANIFEST))
+
+
+class PackedDataset:
+    """Read-only view of a packed dataset.
+
+    ``dataset[i]`` and ``dataset[a:b]`` (within one shard) return uint8
+    views of the memory-mapped shard, without copying.
+    """
+
+    def __init__(self, source):
+        manifest_path = source if os.path.isfile(source) else os.path.join(source, MANIFEST)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{manifest_path} is not a {FORMAT} manifest")
+        root = os.path.dirname(manifest_path)
+        self.class_names = manifest["class_names"]
+        self.paths = [record["path"] for record in manifest["records"]]
+        self.labels = np.array([record["label"] for record in manifest["records"]], dtype=np.int64)
+        self.shards = [
+            np.load(os.path.join(root, shard["file"]), mmap_mode="r")[:shard["count"]]
+            for shard in manifest["shards"]
+        ]
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _locate(self, index):
+        shard = int(np.searchsorted(self.offsets, index, side="right") - 1)
+        return shard, index - int(self.offsets[shard])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            shard, offset = self._locate(start)
+            if step != 1 or stop - start > len(self.shards[shard]) - offset:
+                raise IndexError("slices must be contiguous and within one shard")
+            return self.shards[shard][offset:offset + stop - start]
+        shard, offset = self._locate(key)
+        return self.shards[shard][offset]
+
+    def iter_ranges(self, batch_size):
+        """Yield ``(start, stop)`` index ranges that never cross a shard."""
+        for shard_start, shard_stop in zip(self.offsets[:-1], self.offsets[1:]):
+            for start in range(int(shard_start), int(shard_stop), batch_size):
+                yield start, min(start + batch_size, int(shard_stop))
+
+    def iter_batches(self, batch_size):
+        """Yield ``(paths, batch)`` of normalized float32 images.
+
+        Like ``score_images.iter_batches``, each batch is a view of a reused
+        buffer and is only valid until the next one is requested.
+        """
+        buffer = batch_buffer(batch_size)
+        for start, stop in self.iter_ranges(batch_size):
+            batch = normalize(self[start:stop], out=buffer[:stop - start])
+            yield self.paths[start:stop], batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("directory", help="class-per-folder image tree or split.json:<split>, e.g. Training")
+    parser.add_argument("output", help="directory for the shards and manifest.json")
+    parser.add_argument("--shard-size", type=int, default=1024,
+                        help="images per shard (%(default)s x 367 KB = ~376 MB)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    pack(args.directory, args.output, args.shard_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
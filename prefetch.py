@@ -0,0 +1,64 @@
+"""Decode and preprocess images on a thread pool while the model runs.
+
+``prefetch_batches`` keeps up to ``prefetch`` batches decoding in the
+background. Each batch is written into its own preallocated float32 buffer,
+so the consumer can run inference on one batch while the pool fills the
+next ones. Threads are enough here: Pillow releases the GIL while decoding
+and resizing, so the work spreads over all cores without copying pixels
+between processes.
+"""
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from preprocessing import INPUT_SHAPE, JPEG_DRAFT, load_image
+
+
+def _load(path, out, draft):
+    try:
+        load_image(path, out=out, draft=draft)
+    except (OSError, UnidentifiedImageError) as e:
+        print(f"Skipping {path}: {e}", file=sys.stderr)
+        return False
+    return True
+
+
+def prefetch_batches(paths, batch_size, workers=None, prefetch=2, draft=JPEG_DRAFT):
+    """Yield ``(paths, batch)`` like ``score_images.iter_batches``, in order.
+
+    A yielded batch stays valid until the next one is requested; its buffer
+    is then reused for a batch further ahead.
+    """
+    paths = iter(paths)
+    free = deque(
+        np.empty((batch_size, *INPUT_SHAPE), dtype=np.float32) for _ in range(prefetch + 1)
+    )
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        def submit_next():
+            chunk = list(islice(paths, batch_size))
+            if not chunk:
+                return False
+            buffer = free.popleft()
+            futures = [pool.submit(_load, path, buffer[i], draft) for i, path in enumerate(chunk)]
+            pending.append((chunk, buffer, futures))
+            return True
+
+        while len(pending) < prefetch and submit_next():
+            pass
+        while pending:
+            chunk, buffer, futures = pending.popleft()
+            ok = [future.result() for future in futures]
+            if all(ok):
+                yield chunk, buffer[:len(chunk)]
+            elif any(ok):
+                yield [path for path, loaded in zip(chunk, ok) if loaded], buffer[:len(chunk)][ok]
+            free.append(buffer)
+            while len(pending) < prefetch and submit_next():
+                pass
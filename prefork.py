@@ -0,0 +1,217 @@
+"""Serve the inference API from several pre-forked worker processes.
+
+The parent process loads every model once and runs one image through it,
+then forks
+``--workers`` processes that accept connections on one shared listening
+socket. Pages the workers only read stay shared copy-on-write, so an extra
+worker costs its activations and Python heap rather than another copy of
+the weights. With the TFLite engines the weights are read in place from the
+memory-mapped ``.tflite`` files (XNNPACK, which would repack them into
+private memory, is off unless ``--xnnpack`` is given).
+
+TensorFlow's runtime is not fork-safe: its thread pools do not exist in a
+forked child, and the first Keras prediction there hangs. Models are
+therefore pre-loaded only with the ``tflite-*`` and ``onnx`` engines, run
+with ``--threads`` (default 1) threads per worker. With ``keras`` every
+worker loads and warms up its own models after the fork.
+
+The parent warms up at batch size 1 only. A TFLite interpreter resized to a
+large batch keeps arenas of several GB of private, dirty memory, which
+would not stay shared anyway. ``--warmup-max-batch`` makes every worker
+warm up at ``--max-batch-size`` after the fork instead of on its first large
+batch. A worker that exits within ``MIN_UPTIME`` seconds of starting is
+restarted after a delay that doubles on each such failure, up to
+``MAX_RESTART_DELAY``.
+
+Unique and shared memory per worker is printed once the workers are up and
+then every ``--report-interval`` seconds. ``unique`` is what each extra
+worker costs; the sum of ``pss`` is the RAM the whole group uses.
+
+Usage:
+    MEDICT_BACKEND=tflite-dynamic python prefork.py --workers 4 --port 8600
+"""
+import argparse
+import gc
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import memstats
+from backends import BACKEND_NAMES, set_backend
+from cancer_types import cancer_types
+from inference import warm_up
+from server import InferenceApp
+
+PRELOADABLE_BACKENDS = ("tflite-dynamic", "tflite-int8", "onnx")
+MIN_UPTIME = 10.0
+MAX_RESTART_DELAY = 60.0
+
+
+def listen(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    def __init__(self, sock, args, preloaded):
+        self.sock = sock
+        self.args = args
+        self.preloaded = preloaded
+        self.workers = {}
+        self.started = {}
+        self.failures = {}
+        # slot -> monotonic time at which to start its replacement worker
+        self.restarts = {}
+        self.stopping = False
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = slot
+            self.started[pid] = time.monotonic()
+            return
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self._serve()
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _serve(self):
+        import uvicorn
+
+        if not self.preloaded:
+            set_backend(self.args.backend, self.args.threads)
+        # Preloaded models are already warm at batch size 1; the larger batch
+        # sizes, if wanted, are warmed here in the worker's private memory.
+        warmup = not self.preloaded or self.args.warmup_max_batch
+        app = InferenceApp(self.args.max_batch_size, self.args.max_wait_ms, warmup)
+        config = uvicorn.Config(app, lifespan="on", log_level=self.args.log_level)
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for slot in range(self.args.workers):
+            self.spawn(slot)
+        print(f"Serving on http://{self.args.host}:{self.args.port} with {self.args.workers} workers",
+              file=sys.stderr)
+
+        # The first report waits for the workers to finish starting up
+        next_report = time.monotonic() + 10
+        while self.workers or (self.restarts and not self.stopping):
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid:
+                self.worker_exited(pid, status)
+                continue
+            now = time.monotonic()
+            for slot, when in list(self.restarts.items()):
+                if now >= when and not self.stopping:
+                    del self.restarts[slot]
+                    self.spawn(slot)
+            if self.args.report_interval and time.monotonic() >= next_report and not self.stopping:
+                print_memory_report(self.workers)
+                next_report = time.monotonic() + self.args.report_interval
+            time.sleep(0.2)
+
+    def worker_exited(self, pid, status):
+        slot = self.workers.pop(pid)
+        uptime = time.monotonic() - self.started.pop(pid)
+        if self.stopping:
+            return
+        if uptime < MIN_UPTIME:
+            # Crashing at startup: back off instead of forking in a tight loop
+            self.failures[slot] = self.failures.get(slot, 0) + 1
+            delay = min(2 ** (self.failures[slot] - 1), MAX_RESTART_DELAY)
+        else:
+            self.failures[slot] = 0
+            delay = 0
+        print(f"Worker {pid} exited with status {status} after {uptime:.1f}s; "
+              f"starting a new one in {delay:.0f}s", file=sys.stderr)
+        self.restarts[slot] = time.monotonic() + delay
+
+
+def print_memory_report(workers):
+    rows = [("parent", os.getpid())] + [(f"worker {slot}", pid) for pid, slot in sorted(workers.items())]
+    print(f"{'process':10} {'pid':>7} {'unique':>10} {'shared':>10} {'pss':>10} {'rss':>10}", file=sys.stderr)
+    total_pss = 0
+    for name, pid in rows:
+        memory = memstats.memory_breakdown(pid)
+        if memory is None:
+            print(f"{name:10} {pid:>7} (memory breakdown unavailable)", file=sys.stderr)
+            continue
+        total_pss += memory["pss"]
+        print(f"{name:10} {pid:>7} " + " ".join(
+            f"{memstats.format_bytes(memory[key]):>10}" for key in ("unique", "shared", "pss", "rss")
+        ), file=sys.stderr)
+    print(f"{'total':10} {'':>7} {'':>10} {'':>10} {memstats.format_bytes(total_pss):>10}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1, help="inference threads per worker")
+    parser.add_argument(
+        "--backend", default=os.environ.get("MEDICT_BACKEND", "keras"),
+        choices=BACKEND_NAMES, help="inference engine (default: %(default)s)",
+    )
+    parser.add_argument("--xnnpack", action="store_true",
+                        help="let TFLite use XNNPACK: faster kernels, but private copies of the weights")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--warmup-max-batch", action="store_true",
+                        help="warm up each worker at --max-batch-size after the fork (more memory per worker)")
+    parser.add_argument("--report-interval", type=float, default=300,
+                        help="seconds between memory reports; 0 disables them (default: %(default)s)")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("uvicorn") is None:
+        parser.exit(1, "prefork.py needs uvicorn: pip install uvicorn\n")
+
+    os.environ["MEDICT_TFLITE_XNNPACK"] = "1" if args.xnnpack else "0"
+    preloaded = args.backend in PRELOADABLE_BACKENDS
+    if preloaded:
+        set_backend(args.backend, args.threads)
+        start = time.perf_counter()
+        # Batch size 1 only: larger batches grow private per-interpreter arenas
+        warm_up(cancer_types, (1,))
+        print(f"Loaded and warmed up the models in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    else:
+        print(f"The {args.backend} engine cannot be loaded before forking; "
+              "each worker loads its own models", file=sys.stderr)
+
+    sock = listen(args.host, args.port)
+    # Move everything allocated so far out of the garbage collector's reach,
+    # so collections in the workers do not write to (and un-share) its pages.
+    gc.freeze()
+    PreforkServer(sock, args, preloaded).run()
+
+
+if __name__ == "__main__":
+    main()
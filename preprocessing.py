@@ -0,0 +1,144 @@
+"""Image decoding and normalization into reusable float32 batch buffers.
+
+The original pipeline (``np.asarray(img) / 255.0`` then ``expand_dims``)
+built a float64 array per image, copied it again to add the batch axis and
+left TensorFlow to cast it to float32. Here each image is decoded, resized
+and normalized straight into its row of a preallocated float32 buffer.
+
+Normalization goes through a 256-entry lookup table computed exactly like
+the original (float64 division, then float32), so the values fed to the
+model are bit-identical to ``float32(pixel / 255.0)``.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from PIL import Image
+
+import metrics
+
+INPUT_SIZE = (350, 350)
+INPUT_SHAPE = (INPUT_SIZE[1], INPUT_SIZE[0], 3)
+
+NORMALIZE_LUT = (np.arange(256) / 255.0).astype(np.float32)
+
+# JPEG draft decoding lets libjpeg downscale by 1/2, 1/4 or 1/8 while
+# decoding, which is much faster for large scans but changes the resized
+# pixels slightly, so it is opt-in.
+JPEG_DRAFT = os.environ.get("MEDICT_JPEG_DRAFT", "").lower() in ("1", "true", "yes")
+
+
+class StageTimings:
+    """Accumulated wall time and call count per preprocessing stage.
+
+    Every stage is also fed to the ``metrics`` histograms when enabled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+            self.counts[stage] += 1
+        metrics.observe(stage, seconds)
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {
+                    "total_seconds": self.seconds[stage],
+                    "count": self.counts[stage],
+                    "mean_ms": 1000 * self.seconds[stage] / self.counts[stage],
+                }
+                for stage in self.seconds
+            }
+
+    def reset(self):
+        with self._lock:
+            self.seconds.clear()
+            self.counts.clear()
+
+
+timings = StageTimings()
+
+_buffers = threading.local()
+
+
+def batch_buffer(batch_size):
+    """Return this thread's reusable (batch_size, 350, 350, 3) float32 buffer.
+
+    The buffer is overwritten by the next batch decoded on the same thread,
+    so callers must finish with it (or copy it) before decoding again.
+    """
+    buffer = getattr(_buffers, "array", None)
+    if buffer is None or len(buffer) < batch_size:
+        buffer = np.empty((batch_size, *INPUT_SHAPE), dtype=np.float32)
+        _buffers.array = buffer
+    return buffer[:batch_size]
+
+
+def _apply_draft(image):
+    if image.format == "JPEG" and (
+        image.width >= 2 * INPUT_SIZE[0] and image.height >= 2 * INPUT_SIZE[1]
+    ):
+        # draft() never scales below the requested size
+        image.draft("RGB", INPUT_SIZE)
+
+
+def resize_image(image):
+    """Resize a PIL image to 350x350 RGB; returns a uint8 array."""
+    start = time.perf_counter()
+    img = image.convert("RGB") if image.mode != "RGB" else image
+    if img.size != INPUT_SIZE:
+        img = img.resize(INPUT_SIZE)
+    pixels = np.asarray(img)
+    timings.add("resize", time.perf_counter() - start)
+    return pixels
+
+
+def normalize(pixels, out=None):
+    """Scale uint8 pixels to [0, 1] float32, into ``out`` when given."""
+    start = time.perf_counter()
+    out = np.take(NORMALIZE_LUT, pixels, out=out)
+    timings.add("normalize", time.perf_counter() - start)
+    return out
+
+
+def preprocess_image(image, out=None):
+    """Resize a PIL image to 350x350 RGB and scale it to [0, 1] as float32.
+
+    The result is written into ``out`` when given (e.g. one row of a batch
+    buffer) and returned.
+    """
+    return normalize(resize_image(image), out)
+
+
+def decode_image(source, draft=JPEG_DRAFT):
+    """Decode and resize an image file (path or file object) to uint8 pixels."""
+    start = time.perf_counter()
+    with Image.open(source) as image:
+        if draft:
+            _apply_draft(image)
+        image.load()
+        timings.add("decode", time.perf_counter() - start)
+        return resize_image(image)
+
+
+def load_image(source, out=None, draft=JPEG_DRAFT):
+    """Decode an image file (path or file object) straight into ``out``."""
+    return normalize(decode_image(source, draft), out)
+
+
+def preprocess_batch(images, out=None):
+    """Preprocess PIL images into rows of ``out`` (a new array by default)."""
+    images = list(images)
+    if out is None:
+        out = np.empty((len(images), *INPUT_SHAPE), dtype=np.float32)
+    for row, image in zip(out, images):
+        preprocess_image(image, row)
+    return out[:len(images)]
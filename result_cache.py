@@ -0,0 +1,112 @@
+"""Cache of prediction results keyed by image content.
+
+Clinicians often upload the same scan again, and every widget change in the
+app reruns the prediction for the file that is already uploaded. Results
+are keyed by the SHA-256 of the image bytes, the model that produced them
+(engine, file, size and modification time) and the preprocessing version,
+so a retrained model or a preprocessing change never serves stale results.
+
+The in-memory tier is a bounded LRU (``MEDICT_CACHE_SIZE`` entries, default
+256, 0 disables caching). Setting ``MEDICT_CACHE_DIR`` adds an on-disk tier
+that survives restarts and is shared between processes.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def image_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def model_id(backend_name, path):
+    try:
+        stat = os.stat(path)
+        version = f"{stat.st_size}-{stat.st_mtime_ns}"
+    except OSError:
+        version = "missing"
+    return f"{backend_name}:{os.path.abspath(path)}:{version}"
+
+
+class PredictionCache:
+    def __init__(self, max_entries=256, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or bool(self.directory)
+
+    def _disk_path(self, key):
+        name = hashlib.sha256("|".join(map(str, key)).encode()).hexdigest()
+        return os.path.join(self.directory, name[:2], f"{name}.npy")
+
+    def get(self, key):
+        with self._lock:
+            probabilities = self._memory.get(key)
+            if probabilities is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return probabilities
+        if self.directory:
+            try:
+                probabilities = np.load(self._disk_path(key))
+            except (OSError, ValueError):
+                probabilities = None
+            if probabilities is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, probabilities)
+                return probabilities
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, probabilities):
+        probabilities = np.asarray(probabilities)
+        with self._lock:
+            self._remember(key, probabilities)
+        if self.directory:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, probabilities)
+            os.replace(tmp_path, path)
+
+    def _remember(self, key, probabilities):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = probabilities
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+            }
+
+
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get("MEDICT_CACHE_SIZE", "256")),
+    directory=os.environ.get("MEDICT_CACHE_DIR") or None,
+)
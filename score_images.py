@@ -0,0 +1,175 @@
+"""Score every image under a directory tree without going through the UI.
+
+Usage:
+    python score_images.py Testing --cancer-type brain --output testing.csv
+    python score_images.py Training -c brain -o training.jsonl --batch-size 64 --threads 8 --workers 4
+
+Results are written as they are produced, one row per image, so partial
+output is usable if a long run is interrupted.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from PIL import UnidentifiedImageError
+
+import preprocessing
+from backends import BACKEND_NAMES, set_backend
+from cancer_types import cancer_types_by_key
+from image_folders import iter_source_paths
+from inference import DEFAULT_BATCH_SIZE, predict_probabilities, to_prediction
+from pack_dataset import PackedDataset, is_packed
+from prefetch import prefetch_batches
+from preprocessing import JPEG_DRAFT, batch_buffer, load_image
+
+
+def iter_batches(paths, batch_size, draft=JPEG_DRAFT):
+    """Yield ``(paths, batch)`` with the images decoded into a float32 batch.
+
+    Every batch is a view of the same reusable buffer, so it is only valid
+    until the next one is requested. Unreadable files are reported and
+    skipped.
+    """
+    buffer = batch_buffer(batch_size)
+    batch_paths = []
+    for path in paths:
+        try:
+            load_image(path, out=buffer[len(batch_paths)], draft=draft)
+        except (OSError, UnidentifiedImageError) as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        batch_paths.append(path)
+        if len(batch_paths) == batch_size:
+            yield batch_paths, buffer
+            batch_paths = []
+    if batch_paths:
+        yield batch_paths, buffer[:len(batch_paths)]
+
+
+class CsvWriter:
+    def __init__(self, f, labels):
+        self.f = f
+        self.writer = csv.writer(f)
+        self.writer.writerow(["path", "folder", "label", "probability", *labels])
+
+    def write(self, row):
+        self.writer.writerow(
+            [row["path"], row["folder"], row["label"], f"{row['probability']:.6f}"]
+            + [f"{p:.6f}" for p in row["probabilities"].values()]
+        )
+        self.f.flush()
+
+
+class JsonlWriter:
+    def __init__(self, f, labels):
+        self.f = f
+
+    def write(self, row):
+        self.f.write(json.dumps(row) + "\n")
+        self.f.flush()
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter}
+
+
+def iter_source_batches(source, batch_size, draft=JPEG_DRAFT, workers=None, prefetch=2):
+    """Yield ``(paths, batch)`` from an image tree or a packed dataset.
+
+    Packed datasets (a ``pack_dataset.py`` output directory or its
+    ``manifest.json``) are sliced straight from their memory-mapped shards;
+    ``split.json:test`` reads one split of a ``split_dataset.py`` manifest.
+    For image trees, ``workers=0`` decodes on the calling thread between
+    forward passes; otherwise a pool of ``workers`` threads (default: one
+    per core) decodes up to ``prefetch`` batches ahead of the model.
+    """
+    if is_packed(source):
+        return PackedDataset(source).iter_batches(batch_size)
+    if workers == 0:
+        return iter_batches(iter_source_paths(source), batch_size, draft)
+    return prefetch_batches(iter_source_paths(source), batch_size, workers, prefetch, draft)
+
+
+def score_directory(root, cancer_type, writer, batch_size=DEFAULT_BATCH_SIZE, draft=JPEG_DRAFT,
+                    workers=None, prefetch=2):
+    """Score every image under ``root``; returns the number of images scored."""
+    labels = [cancer_type.labels[i] for i in sorted(cancer_type.labels)]
+    scored = 0
+    start = time.perf_counter()
+    for paths, batch in iter_source_batches(root, batch_size, draft, workers, prefetch):
+        probabilities = predict_probabilities(batch, cancer_type)
+        for path, p in zip(paths, probabilities):
+            prediction = to_prediction(p, cancer_type)
+            writer.write({
+                "path": path,
+                "folder": os.path.basename(os.path.dirname(path)),
+                "label": prediction.label,
+                "probability": prediction.probability,
+                "probabilities": dict(zip(labels, map(float, prediction.probabilities))),
+            })
+        scored += len(paths)
+        elapsed = time.perf_counter() - start
+        print(f"\r{scored} images, {scored / elapsed:.1f} images/s", end="", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"\rScored {scored} images in {elapsed:.1f}s "
+          f"({scored / elapsed if elapsed else 0:.1f} images/s)", file=sys.stderr)
+    for stage, stats in preprocessing.timings.summary().items():
+        print(f"  {stage:10} {stats['total_seconds']:8.2f}s total, {stats['mean_ms']:7.2f} ms per call",
+              file=sys.stderr)
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("root", help="directory tree of images, packed dataset or split.json:<split> to score")
+    parser.add_argument(
+        "-c", "--cancer-type", required=True, choices=list(cancer_types_by_key),
+        help="which model to score the images with",
+    )
+    parser.add_argument(
+        "-o", "--output", required=True,
+        help="results file; the format follows the extension (.csv or .jsonl)",
+    )
+    parser.add_argument("--format", choices=WRITERS, help="override the output format")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="threads decoding images ahead of the model; 0 decodes serially (default: one per core)",
+    )
+    parser.add_argument(
+        "--prefetch", type=int, default=2,
+        help="batches decoded ahead of the model (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jpeg-draft", action="store_true", default=JPEG_DRAFT,
+        help="let libjpeg downscale large JPEGs while decoding (faster, slightly different pixels)",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=0,
+        help="threads per operator for the inference engine (default: one per core)",
+    )
+    parser.add_argument(
+        "--backend", default=os.environ.get("MEDICT_BACKEND", "keras"),
+        choices=BACKEND_NAMES, help="inference engine (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if output_format not in WRITERS:
+        parser.error("cannot infer the output format; use --format csv or --format jsonl")
+
+    set_backend(args.backend, args.threads or None)
+    cancer_type = cancer_types_by_key[args.cancer_type]
+    labels = [cancer_type.labels[i] for i in sorted(cancer_type.labels)]
+    with open(args.output, "w", newline="") as f:
+        writer = WRITERS[output_format](f, labels)
+        score_directory(
+            args.root, cancer_type, writer, batch_size=args.batch_size, draft=args.jpeg_draft,
+            workers=args.workers, prefetch=args.prefetch,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Standalone HTTP inference service with dynamic micro-batching.
+
+Concurrent requests for the same cancer type are coalesced into one batch,
+up to ``--max-batch-size`` images or until ``--max-wait-ms`` has passed
+since the first queued image, and scored with a single forward pass.
+
+Usage:
+    python server.py --port 8600 --max-batch-size 16 --max-wait-ms 10
+
+    curl --data-binary @kidney.jpeg http://localhost:8600/predict/kidney
+
+Every model is loaded and warmed up with dummy batches before the server
+accepts connections; ``/readyz`` answers 200 only after that, ``/healthz``
+as soon as the process runs.
+
+With ``MEDICT_METRICS=1``, per-stage latency histograms are served on
+``/metrics`` in the Prometheus text format.
+
+The Streamlit app sends its predictions here when ``MEDICT_INFERENCE_URL``
+is set, e.g. ``MEDICT_INFERENCE_URL=http://localhost:8600``.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+import metrics
+from cancer_types import cancer_types
+from inference import (
+    Prediction, cache_key, load_image, predict_probabilities, to_prediction, warm_up, warmup_batch_sizes,
+)
+from result_cache import prediction_cache
+
+MAX_BODY_BYTES = 20 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collects preprocessed images for one cancer type into batches."""
+
+    def __init__(self, cancer_type, executor, max_batch_size=16, max_wait_ms=10):
+        self.cancer_type = cancer_type
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, array):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((array, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            arrays, futures = zip(*batch)
+            try:
+                probabilities = await loop.run_in_executor(
+                    self.executor, predict_probabilities, np.stack(arrays), self.cancer_type
+                )
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for future, p in zip(futures, probabilities):
+                if not future.done():
+                    future.set_result(to_prediction(p, self.cancer_type))
+
+
+class InferenceApp:
+    """ASGI application exposing ``POST /predict/{lung|kidney|brain}``."""
+
+    def __init__(self, max_batch_size=16, max_wait_ms=10, warmup=True):
+        # One inference thread: TensorFlow already spreads each batch over all
+        # cores, so running batches side by side would only oversubscribe them.
+        self.inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.batchers = {
+            c.key: MicroBatcher(c, self.inference_executor, max_batch_size, max_wait_ms)
+            for c in cancer_types
+        }
+        self.max_batch_size = max_batch_size
+        self.warmup = warmup
+        self.ready = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.warmup:
+                    # Servers do not accept connections until startup completes,
+                    # so no request ever reaches a cold model.
+                    seconds = await asyncio.get_running_loop().run_in_executor(
+                        self.inference_executor, warm_up, cancer_types, warmup_batch_sizes(self.max_batch_size)
+                    )
+                    for path, elapsed in seconds.items():
+                        logger.info("Warmed up %s in %.2fs", path, elapsed)
+                for batcher in self.batchers.values():
+                    batcher.start()
+                self.ready = True
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.inference_executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        path = scope["path"].rstrip("/")
+        if path == "/healthz":
+            await _send_json(send, 200, {"status": "ok"})
+            return
+        if path == "/readyz":
+            if self.ready:
+                await _send_json(send, 200, {"status": "ready"})
+            else:
+                await _send_json(send, 503, {"status": "warming up"})
+            return
+        if path == "/metrics" and metrics.enabled:
+            await _send_text(send, 200, metrics.stages.render(), metrics.CONTENT_TYPE)
+            return
+        prefix, _, key = path.rpartition("/")
+        if prefix != "/predict" or key not in self.batchers:
+            await _send_json(send, 404, {"error": "not found"})
+            return
+        if scope["method"] != "POST":
+            await _send_json(send, 405, {"error": "use POST with the image as the request body"})
+            return
+
+        with metrics.timer("upload_read"):
+            body = await _read_body(receive)
+        if body is None:
+            await _send_json(send, 413, {"error": "image too large"})
+            return
+        batcher = self.batchers[key]
+        prediction = await self._predict(batcher, body)
+        if prediction is None:
+            await _send_json(send, 400, {"error": "could not decode image"})
+            return
+        await _send_json(send, 200, _prediction_payload(prediction, batcher.cancer_type))
+
+    async def _predict(self, batcher, body):
+        loop = asyncio.get_running_loop()
+        result_key = None
+        if prediction_cache.enabled:
+            result_key = cache_key(body, batcher.cancer_type)
+            probabilities = prediction_cache.get(result_key)
+            if probabilities is not None:
+                return to_prediction(probabilities, batcher.cancer_type)
+        try:
+            array = await loop.run_in_executor(None, _decode, body)
+        except (OSError, ValueError, Image.DecompressionBombError, UnidentifiedImageError):
+            # Truncated, malformed or oversized images are the client's fault
+            return None
+        prediction = await batcher.submit(array)
+        if result_key is not None:
+            prediction_cache.put(result_key, prediction.probabilities)
+        return prediction
+
+
+def _decode(body):
+    # A fresh array rather than a shared batch buffer: it waits in the queue
+    # while other requests are decoded on the same executor threads.
+    return load_image(io.BytesIO(body))
+
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status, payload):
+    await _send_text(send, status, json.dumps(payload), "application/json")
+
+
+async def _send_text(send, status, text, content_type):
+    body = text.encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _prediction_payload(prediction, cancer_type):
+    return {
+        "label": prediction.label,
+        "probability": prediction.probability,
+        "probabilities": {
+            cancer_type.labels[i]: float(prediction.probabilities[i]) for i in sorted(cancer_type.labels)
+        },
+    }
+
+
+def predict_remote(base_url, image, cancer_type, timeout=60):
+    """Score an image on a running inference server; returns a Prediction.
+
+    ``image`` is either the encoded image bytes or a PIL image.
+    """
+    if isinstance(image, bytes):
+        data = image
+    else:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        data = buffer.getvalue()
+    request = urllib.request.Request(
+        f"{base_url.rstrip('/')}/predict/{cancer_type.key}",
+        data=data,
+        headers={"Content-Type": "application/octet-stream"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = json.load(response)
+    probabilities = np.array(
+        [payload["probabilities"][cancer_type.labels[i]] for i in sorted(cancer_type.labels)]
+    )
+    return Prediction(payload["label"], payload["probability"], probabilities)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument(
+        "--max-wait-ms", type=float, default=10,
+        help="how long the first image of a batch waits for others to join",
+    )
+    parser.add_argument(
+        "--no-warmup", dest="warmup", action="store_false",
+        help="start serving without running dummy batches through the models first",
+    )
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        parser.exit(1, "server.py needs uvicorn: pip install uvicorn\n")
+    app = InferenceApp(args.max_batch_size, args.max_wait_ms, args.warmup)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Split a class-per-folder image tree into train/test sets without copying.
+
+Instead of copying every file into ``training/`` and ``testing/`` folders
+(as the Kidney notebook's ``split_data()`` does), this writes a small JSON
+manifest with one ``(path, class, split)`` record per image. The split is
+stratified per class and fully determined by ``--seed``, so re-splitting
+with another ratio or seed takes as long as listing the folder.
+
+Every loader accepts ``<manifest>:<split>`` wherever it takes an image
+folder. Tools that insist on a real folder layout can get one made of
+hardlinks or symlinks with ``--link-dir``.
+
+Usage:
+    python split_dataset.py CT-KIDNEY-DATASET -o kidney_split.json --fractions train=0.75 test=0.25
+    python score_images.py kidney_split.json:test -c kidney -o kidney_test.csv
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from image_folders import SPLIT_FORMAT, list_class_files, read_split
+
+
+def split_files(directory, fractions, seed=42):
+    """Assign every image under ``directory`` to a split; returns the manifest.
+
+    ``fractions`` maps split names to the share of each class they get.
+    """
+    total = sum(fractions.values())
+    bounds = np.cumsum([0.0] + [fraction / total for fraction in fractions.values()])
+    paths, labels, class_names = list_class_files(directory)
+    paths_by_class = [[] for _ in class_names]
+    for path, label in zip(paths, labels):
+        paths_by_class[label].append(path)
+
+    rng = np.random.default_rng(seed)
+    records = []
+    for class_name, class_paths in zip(class_names, paths_by_class):
+        order = rng.permutation(len(class_paths))
+        cuts = np.round(bounds * len(class_paths)).astype(int)
+        for split, start, stop in zip(fractions, cuts[:-1], cuts[1:]):
+            for i in sorted(order[start:stop]):
+                records.append({
+                    "path": os.path.relpath(class_paths[i], directory),
+                    "class": class_name,
+                    "split": split,
+                })
+    return {
+        "format": SPLIT_FORMAT,
+        "root": directory,
+        "seed": seed,
+        "splits": dict(fractions),
+        "class_names": class_names,
+        "records": records,
+    }
+
+
+def write_manifest(manifest, manifest_path):
+    """Write ``manifest`` with its root relative to the manifest's folder."""
+    manifest = dict(manifest)
+    manifest["root"] = os.path.relpath(manifest["root"], os.path.dirname(os.path.abspath(manifest_path)))
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+
+def link_tree(manifest_path, output_dir, method="hardlink"):
+    """Materialize ``<output_dir>/<split>/<class>/<file>`` as links to the originals.
+
+    Hardlinks fall back to symlinks across filesystems. Returns the number
+    of links created.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    created = 0
+    for split in manifest["splits"]:
+        paths, labels, class_names = read_split(manifest_path, split)
+        for path, label in zip(paths, labels):
+            target_dir = os.path.join(output_dir, split, class_names[label])
+            os.makedirs(target_dir, exist_ok=True)
+            target = os.path.join(target_dir, os.path.basename(path))
+            if os.path.lexists(target):
+                os.remove(target)
+            if method == "hardlink":
+                try:
+                    os.link(path, target)
+                    created += 1
+                    continue
+                except OSError:
+                    pass
+            os.symlink(os.path.abspath(path), target)
+            created += 1
+    return created
+
+
+def _fraction(value):
+    name, sep, fraction = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=FRACTION, got {value!r}")
+    return name, float(fraction)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("directory", help="class-per-folder image tree")
+    parser.add_argument("-o", "--output", required=True, help="manifest file to write (.json)")
+    parser.add_argument("--fractions", nargs="+", type=_fraction, default=[("train", 0.75), ("test", 0.25)],
+                        help="split names and shares, e.g. train=0.7 val=0.1 test=0.2 (default: train=0.75 test=0.25)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--link-dir", help="also build <link-dir>/<split>/<class>/ folders of links")
+    parser.add_argument("--link", choices=["hardlink", "symlink"], default="hardlink")
+    args = parser.parse_args()
+    if not args.output.endswith(".json"):
+        parser.error("the manifest must be a .json file")
+
+    manifest = split_files(args.directory, dict(args.fractions), args.seed)
+    write_manifest(manifest, args.output)
+    for split in manifest["splits"]:
+        count = sum(record["split"] == split for record in manifest["records"])
+        print(f"{split:8} {count} images  ({args.output}:{split})", file=sys.stderr)
+    if args.link_dir:
+        created = link_tree(args.output, args.link_dir, args.link)
+        print(f"Linked {created} images under {args.link_dir}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
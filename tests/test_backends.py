@@ -0,0 +1,21 @@
+import pytest
+
+from backends import BACKEND_NAMES, create_backend
+from cancer_types import cancer_types_by_key
+
+
+@pytest.mark.parametrize("spec", ["tflite-foo", "keras-x", "tflite", "onnx-int8", "torch", ""])
+def test_unknown_backend_is_rejected(spec):
+    with pytest.raises(ValueError, match="Unknown backend"):
+        create_backend(spec)
+
+
+@pytest.mark.parametrize("spec", BACKEND_NAMES)
+def test_known_backends_keep_their_name(spec):
+    assert create_backend(spec).name == spec
+
+
+def test_tflite_variant_picks_the_model_file():
+    brain = cancer_types_by_key["brain"]
+    assert create_backend("tflite-dynamic").model_file(brain, "models/brain.h5") == "models/brain_dynamic.tflite"
+    assert create_backend("onnx").model_file(brain, "models/brain.h5") == "models/brain.onnx"
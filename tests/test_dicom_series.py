@@ -0,0 +1,43 @@
+import copy
+
+import numpy as np
+
+from cancer_types import cancer_types_by_key
+from dicom_series import SeriesAggregate
+
+# Lung labels: Adenocarcinoma, Large Cell Carcinoma, Normal, Squamous Cell Carcinoma
+LUNG = cancer_types_by_key["lung"]
+
+
+def slices(*rows):
+    return np.array(rows, dtype=np.float64)
+
+
+def test_normal_series_reports_mean_normal_probability():
+    aggregate = SeriesAggregate(LUNG, min_slices=2)
+    aggregate.update(0, slices([0.1, 0.0, 0.9, 0.0], [0.6, 0.0, 0.4, 0.0], [0.0, 0.3, 0.7, 0.0]))
+    result = aggregate.result()
+    assert result["label"] == "Normal"
+    assert result["probability"] == np.mean([0.9, 0.4, 0.7])
+    assert result["per_label"]["Adenocarcinoma"]["peak_slice"] == 1
+
+
+def test_finding_on_enough_slices_reports_its_peak():
+    aggregate = SeriesAggregate(LUNG, min_slices=2)
+    aggregate.update(0, slices([0.7, 0.0, 0.3, 0.0], [0.0, 0.0, 1.0, 0.0]))
+    aggregate.update(2, slices([0.8, 0.0, 0.2, 0.0]))
+    result = aggregate.result()
+    assert result["label"] == "Adenocarcinoma"
+    assert result["probability"] == 0.8
+    assert result["per_label"]["Adenocarcinoma"]["peak_slice"] == 2
+    assert result["slice_labels"] == ["Adenocarcinoma", "Normal", "Adenocarcinoma"]
+
+
+def test_without_normal_label_reports_most_predicted_label():
+    cancer_type = copy.copy(LUNG)
+    cancer_type.normal_label = None
+    aggregate = SeriesAggregate(cancer_type)
+    aggregate.update(0, slices([0.1, 0.0, 0.9, 0.0], [0.0, 0.0, 0.6, 0.4], [0.0, 0.0, 0.2, 0.8]))
+    result = aggregate.result()
+    assert result["label"] == "Normal"
+    assert result["probability"] == 0.9
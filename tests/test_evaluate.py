@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from evaluate import Evaluation, compare_to_baseline
+
+
+def test_confusion_matrix_and_metrics():
+    evaluation = Evaluation(["normal", "tumor"])
+    evaluation.update([0, 0, 1], np.array([[0.9, 0.1], [0.3, 0.7], [0.2, 0.8]]))
+    evaluation.update([1, -1], np.array([[0.6, 0.4], [0.5, 0.5]]))
+    report = evaluation.report()
+    assert report["confusion_matrix"]["rows_true_columns_predicted"] == [[1, 1], [1, 1]]
+    assert report["images"] == 5
+    assert report["labelled_images"] == 4
+    assert report["accuracy"] == 0.5
+    assert report["per_class"]["tumor"] == {"precision": 0.5, "recall": 0.5, "f1": 0.5, "support": 2}
+
+
+def test_expected_calibration_error():
+    evaluation = Evaluation(["normal", "tumor"], bins=10)
+    # Two images at 0.95 confidence, one right and one wrong; two at 0.65, both right
+    evaluation.update(
+        [0, 1, 0, 1],
+        np.array([[0.95, 0.05], [0.95, 0.05], [0.65, 0.35], [0.35, 0.65]]),
+    )
+    report = evaluation.report()
+    assert report["ece"] == pytest.approx((2 * abs(0.5 - 0.95) + 2 * abs(1.0 - 0.65)) / 4)
+    assert report["calibration_bins"][9]["count"] == 2
+    assert report["calibration_bins"][6]["accuracy"] == 1.0
+
+
+def test_missing_class_is_left_out_of_macro_average():
+    evaluation = Evaluation(["normal", "tumor", "cyst"])
+    evaluation.update([0, 1], np.array([[0.8, 0.1, 0.1], [0.1, 0.8, 0.1]]))
+    assert evaluation.report()["macro"]["recall"] == 1.0
+
+
+def report(accuracy, f1, ece):
+    return {"accuracy": accuracy, "macro": {"f1": f1}, "ece": ece}
+
+
+def test_baseline_gate_flags_drops_beyond_max_drop():
+    baseline = report(0.90, 0.88, 0.05)
+    assert compare_to_baseline(report(0.90, 0.88, 0.05), baseline, 0.0) == []
+    assert compare_to_baseline(report(0.895, 0.88, 0.055), baseline, 0.01) == []
+    failures = compare_to_baseline(report(0.85, 0.88, 0.08), baseline, 0.01)
+    assert [failure.split()[0] for failure in failures] == ["accuracy", "ECE"]
+
+
+def test_baseline_gate_treats_missing_metric_as_regression():
+    failures = compare_to_baseline(report(0.90, 0.88, None), report(0.90, 0.88, 0.05), 0.0)
+    assert failures == ["ECE 5.00% -> missing"]
+    # Metrics the baseline lacks are not compared
+    assert compare_to_baseline(report(0.90, 0.88, None), {"accuracy": 0.90, "macro": {"f1": 0.88}}, 0.0) == []
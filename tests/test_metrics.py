@@ -0,0 +1,56 @@
+import metrics
+from metrics import METRIC_NAME, Histogram, StageHistograms
+
+
+def bucket_counts(text, stage):
+    prefix = f'{METRIC_NAME}_bucket{{stage="{stage}",le="'
+    return {
+        line[len(prefix):].split('"')[0]: int(line.rsplit(" ", 1)[1])
+        for line in text.splitlines() if line.startswith(prefix)
+    }
+
+
+def test_value_on_a_bound_lands_in_that_bucket():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.1, 0.10001, 1.0, 5.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1]
+    assert histogram.quantile(0.25) == 0.1
+    assert histogram.quantile(1.0) == float("inf")
+
+
+def test_render_is_cumulative_with_inf_sum_and_count():
+    histograms = StageHistograms(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        histograms.observe("decode", seconds)
+    histograms.observe("inference", 0.25)
+    text = histograms.render()
+    assert text.startswith(f"# HELP {METRIC_NAME} ")
+    assert f"# TYPE {METRIC_NAME} histogram\n" in text
+    assert text.endswith("\n")
+    assert bucket_counts(text, "decode") == {"0.1": 2, "1.0": 3, "+Inf": 4}
+    assert bucket_counts(text, "inference") == {"0.1": 0, "1.0": 1, "+Inf": 1}
+    assert f'{METRIC_NAME}_sum{{stage="decode"}} 2.65\n' in text
+    assert f'{METRIC_NAME}_count{{stage="decode"}} 4\n' in text
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    monkeypatch.setattr(metrics, "stages", StageHistograms())
+    metrics.observe("decode", 0.5)
+    with metrics.timer("inference"):
+        pass
+    assert metrics.timer("inference") is metrics.timer("render")
+    assert metrics.stages.summary() == {}
+    assert bucket_counts(metrics.stages.render(), "decode") == {}
+
+
+def test_enabled_timer_records_the_block(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(metrics, "stages", StageHistograms())
+    with metrics.timer("inference"):
+        pass
+    metrics.observe("decode", 0.5)
+    summary = metrics.stages.summary()
+    assert summary["inference"]["count"] == 1
+    assert summary["decode"]["mean_ms"] == 500.0
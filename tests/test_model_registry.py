@@ -0,0 +1,65 @@
+import numpy as np
+
+from model_registry import ModelRegistry
+
+MB = 1024 * 1024
+SIZES = {"a.h5": 1, "b.h5": 1, "c.h5": 1, "large.h5": 2}
+
+
+class FakeModel:
+    def __init__(self, megabytes):
+        self.weights = [np.zeros(megabytes * MB, dtype=np.uint8)]
+
+    def get_weights(self):
+        return self.weights
+
+
+def load_fake(path):
+    return FakeModel(SIZES[path])
+
+
+def test_loads_once_and_counts_hits():
+    registry = ModelRegistry()
+    model = registry.get("a.h5", load_fake)
+    assert registry.get("a.h5", load_fake) is model
+    stats = registry.stats()["a.h5"]
+    assert stats["loads"] == 1
+    assert stats["hits"] == 1
+    assert stats["weight_bytes"] == MB
+
+
+def test_evicts_least_recently_used_over_budget():
+    registry = ModelRegistry(max_bytes=2 * MB)
+    registry.get("a.h5", load_fake)
+    registry.get("b.h5", load_fake)
+    registry.get("a.h5", load_fake)
+    registry.get("c.h5", load_fake)
+    assert registry.is_loaded("a.h5")
+    assert not registry.is_loaded("b.h5")
+    assert registry.is_loaded("c.h5")
+    assert registry.stats()["b.h5"]["evictions"] == 1
+    assert registry.resident_bytes() == 2 * MB
+
+
+def test_keeps_requested_model_larger_than_budget():
+    registry = ModelRegistry(max_bytes=MB)
+    registry.get("a.h5", load_fake)
+    registry.get("large.h5", load_fake)
+    assert not registry.is_loaded("a.h5")
+    assert registry.is_loaded("large.h5")
+
+
+def test_lowering_budget_keeps_most_recent():
+    registry = ModelRegistry()
+    for path in ("a.h5", "b.h5", "c.h5"):
+        registry.get(path, load_fake)
+    registry.set_budget(MB)
+    assert [registry.is_loaded(path) for path in ("a.h5", "b.h5", "c.h5")] == [False, False, True]
+
+
+def test_evicted_model_is_reloaded():
+    registry = ModelRegistry(max_bytes=MB)
+    registry.get("a.h5", load_fake)
+    registry.get("b.h5", load_fake)
+    registry.get("a.h5", load_fake)
+    assert registry.stats()["a.h5"]["loads"] == 2
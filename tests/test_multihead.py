@@ -0,0 +1,37 @@
+import json
+
+import h5py
+import pytest
+
+import multihead
+
+
+def write_merged(path, organs):
+    config = {"class_name": "Functional", "config": {"output_layers": [[organ, 0, 0] for organ in organs]}}
+    with h5py.File(path, "w") as f:
+        f.attrs["model_config"] = json.dumps(config)
+
+
+@pytest.fixture
+def no_model_loads(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("the merged model was loaded")
+
+    monkeypatch.setattr(multihead, "get_model", fail)
+
+
+def test_has_head_reads_output_names_without_loading(tmp_path, no_model_loads):
+    path = str(tmp_path / "merged.h5")
+    write_merged(path, ["lung", "brain"])
+    assert multihead.read_output_names(path) == ["lung", "brain"]
+    assert multihead.has_head("brain", path)
+    assert not multihead.has_head("kidney", path)
+    assert not multihead.has_head("brain", str(tmp_path / "missing.h5"))
+
+
+def test_has_head_rereads_changed_file(tmp_path, no_model_loads):
+    path = str(tmp_path / "merged.h5")
+    write_merged(path, ["lung"])
+    assert not multihead.has_head("kidney", path)
+    write_merged(path, ["lung", "kidney", "brain"] + ["padding"] * 10)
+    assert multihead.has_head("kidney", path)
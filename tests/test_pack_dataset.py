@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from pack_dataset import PackedDataset, pack
+from preprocessing import INPUT_SHAPE
+
+
+@pytest.fixture
+def packed(tmp_path):
+    source = tmp_path / "images"
+    for class_name, count in (("normal", 3), ("tumor", 2)):
+        (source / class_name).mkdir(parents=True)
+        for i in range(count):
+            Image.new("RGB", (40, 30), (10 * i, 100, 200)).save(source / class_name / f"{i}.png")
+    pack(str(source), str(tmp_path / "packed"), shard_size=2, workers=1)
+    return PackedDataset(str(tmp_path / "packed"))
+
+
+def test_index_and_labels(packed):
+    assert len(packed) == 5
+    assert packed.class_names == ["normal", "tumor"]
+    assert packed.labels.tolist() == [0, 0, 0, 1, 1]
+    assert packed[4].shape == INPUT_SHAPE
+    assert packed[4].dtype == np.uint8
+    assert packed[1][0, 0].tolist() == [10, 100, 200]
+
+
+def test_slices_are_views_within_a_shard(packed):
+    batch = packed[2:4]
+    assert batch.shape == (2, *INPUT_SHAPE)
+    assert np.shares_memory(batch, packed.shards[1])
+    np.testing.assert_array_equal(batch[1], packed[3])
+    with pytest.raises(IndexError):
+        packed[1:3]
+    with pytest.raises(IndexError):
+        packed[0:2:2]
+
+
+def test_batches_never_cross_shards(packed):
+    assert list(packed.iter_ranges(3)) == [(0, 2), (2, 4), (4, 5)]
+    paths, batch = next(packed.iter_batches(3))
+    assert len(paths) == 2
+    assert batch.dtype == np.float32
+    np.testing.assert_allclose(batch[1, 0, 0], np.array([10, 100, 200]) / 255.0, rtol=1e-6)
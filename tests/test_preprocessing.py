@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from preprocessing import INPUT_SHAPE, batch_buffer, load_image, preprocess_batch
+
+
+def baseline(image):
+    """The original app preprocessing, cast to the float32 the model gets."""
+    img = image.convert("RGB")
+    img = img.resize((350, 350))
+    return (np.asarray(img) / 255.0).astype(np.float32)
+
+
+def make_image(mode, size):
+    pixels = np.random.default_rng(0).integers(0, 256, (size[1], size[0], 4), dtype=np.uint8)
+    image = Image.fromarray(pixels, "RGBA")
+    return image if mode == "RGBA" else image.convert("RGB").convert(mode)
+
+
+@pytest.mark.parametrize("mode, size, fmt", [
+    ("RGB", (512, 384), "JPEG"),
+    ("RGB", (350, 350), "PNG"),
+    ("L", (300, 420), "PNG"),
+    ("L", (350, 350), "PNG"),
+    ("RGBA", (640, 480), "PNG"),
+    ("P", (200, 150), "PNG"),
+    ("I;16", (350, 350), "PNG"),
+])
+def test_load_image_matches_original_pipeline(mode, size, fmt):
+    data = io.BytesIO()
+    make_image(mode, size).save(data, fmt)
+    expected = baseline(Image.open(io.BytesIO(data.getvalue())))
+    out = batch_buffer(2)[1]
+    result = load_image(io.BytesIO(data.getvalue()), out=out, draft=False)
+    assert result.dtype == np.float32
+    assert result.shape == INPUT_SHAPE
+    np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_preprocess_batch_matches_original_pipeline():
+    images = [make_image("RGB", (350, 350)), make_image("L", (400, 300))]
+    batch = preprocess_batch(images)
+    np.testing.assert_array_equal(batch, np.stack([baseline(image) for image in images]))
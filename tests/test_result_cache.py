@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+from cancer_types import cancer_types_by_key
+from inference import cache_key
+from result_cache import PredictionCache, image_digest, model_id
+
+
+def test_model_id_changes_with_model_file(tmp_path):
+    path = tmp_path / "model.h5"
+    path.write_bytes(b"weights")
+    before = model_id("keras", str(path))
+    assert model_id("keras", str(path)) == before
+    assert model_id("onnx", str(path)) != before
+
+    path.write_bytes(b"retrained weights")
+    assert model_id("keras", str(path)) != before
+    assert model_id("keras", str(tmp_path / "missing.h5")).endswith(":missing")
+
+
+def test_cache_key_depends_on_image_and_cancer_type(tmp_path):
+    path = tmp_path / "model.h5"
+    path.write_bytes(b"weights")
+    brain, kidney = cancer_types_by_key["brain"], cancer_types_by_key["kidney"]
+    key = cache_key(b"scan", brain, str(path))
+    assert key == cache_key(b"scan", brain, str(path))
+    assert key[0] == image_digest(b"scan")
+    assert cache_key(b"other scan", brain, str(path)) != key
+    assert cache_key(b"scan", kidney, str(path)) != key
+    assert cache_key(b"scan", brain, str(path), draft=True) != cache_key(b"scan", brain, str(path), draft=False)
+
+
+def test_memory_tier_is_bounded_lru():
+    cache = PredictionCache(max_entries=2)
+    cache.put(("a",), [0.1, 0.9])
+    cache.put(("b",), [0.2, 0.8])
+    cache.get(("a",))
+    cache.put(("c",), [0.3, 0.7])
+    assert cache.get(("b",)) is None
+    np.testing.assert_array_equal(cache.get(("a",)), [0.1, 0.9])
+    np.testing.assert_array_equal(cache.get(("c",)), [0.3, 0.7])
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_disk_tier_survives_new_cache(tmp_path):
+    PredictionCache(max_entries=0, directory=str(tmp_path)).put(("a", 1), [0.25, 0.75])
+    cache = PredictionCache(directory=str(tmp_path))
+    np.testing.assert_array_equal(cache.get(("a", 1)), [0.25, 0.75])
+    assert cache.disk_hits == 1
+    assert cache.get(("a", 2)) is None
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".tmp")]
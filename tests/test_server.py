@@ -0,0 +1,112 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import server
+from cancer_types import cancer_types_by_key
+from result_cache import PredictionCache
+
+BRAIN = cancer_types_by_key["brain"]
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Batch sizes seen by the model; image ``i`` gets label ``i % 4``."""
+    seen = []
+
+    def predict_probabilities(batch, cancer_type):
+        seen.append(len(batch))
+        return np.eye(4)[batch[:, 0, 0, 0].astype(int) % 4]
+
+    monkeypatch.setattr(server, "predict_probabilities", predict_probabilities)
+    return seen
+
+
+def image(i):
+    return np.full((2, 2, 3), i, dtype=np.float32)
+
+
+def run(coroutine):
+    async def main():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return await coroutine(executor)
+
+    return asyncio.run(main())
+
+
+def test_partial_batch_flushes_after_max_wait(batches):
+    async def scenario(executor):
+        batcher = server.MicroBatcher(BRAIN, executor, max_batch_size=8, max_wait_ms=20)
+        return await asyncio.gather(batcher.submit(image(0)), batcher.submit(image(3)))
+
+    predictions = run(scenario)
+    assert batches == [2]
+    assert [prediction.label for prediction in predictions] == [BRAIN.labels[0], BRAIN.labels[3]]
+
+
+def test_full_batch_flushes_without_waiting(batches):
+    async def scenario(executor):
+        batcher = server.MicroBatcher(BRAIN, executor, max_batch_size=2, max_wait_ms=60_000)
+        return await asyncio.wait_for(asyncio.gather(batcher.submit(image(1)), batcher.submit(image(2))), 5)
+
+    predictions = run(scenario)
+    assert batches == [2]
+    assert [prediction.label for prediction in predictions] == [BRAIN.labels[1], BRAIN.labels[2]]
+
+
+def test_model_error_reaches_every_request_in_the_batch(monkeypatch):
+    calls = []
+
+    def predict_probabilities(batch, cancer_type):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("model failed")
+        return np.eye(4)[:len(batch)]
+
+    monkeypatch.setattr(server, "predict_probabilities", predict_probabilities)
+
+    async def scenario(executor):
+        batcher = server.MicroBatcher(BRAIN, executor, max_batch_size=8, max_wait_ms=20)
+        failed = await asyncio.gather(batcher.submit(image(0)), batcher.submit(image(1)), return_exceptions=True)
+        # The batcher keeps serving after a failed batch
+        return failed, await batcher.submit(image(0))
+
+    failed, prediction = run(scenario)
+    assert [str(e) for e in failed] == ["model failed", "model failed"]
+    assert prediction.label == BRAIN.labels[0]
+
+
+def png(size):
+    pixels = np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    data = io.BytesIO()
+    Image.fromarray(pixels).save(data, "PNG")
+    return data.getvalue()
+
+
+@pytest.mark.parametrize("body", [b"not an image", png((64, 64))[:6000]])
+def test_undecodable_images_are_rejected(monkeypatch, batches, body):
+    monkeypatch.setattr(server, "prediction_cache", PredictionCache(max_entries=0))
+    app = server.InferenceApp(warmup=False)
+    assert asyncio.run(app._predict(app.batchers["brain"], body)) is None
+    assert batches == []
+
+
+def test_decompression_bomb_is_rejected(monkeypatch, batches):
+    monkeypatch.setattr(server, "prediction_cache", PredictionCache(max_entries=0))
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    app = server.InferenceApp(warmup=False)
+    assert asyncio.run(app._predict(app.batchers["brain"], png((100, 100)))) is None
+
+
+def test_malformed_image_value_error_is_rejected(monkeypatch, batches):
+    def load_image(source):
+        raise ValueError("bad header")
+
+    monkeypatch.setattr(server, "prediction_cache", PredictionCache(max_entries=0))
+    monkeypatch.setattr(server, "load_image", load_image)
+    app = server.InferenceApp(warmup=False)
+    assert asyncio.run(app._predict(app.batchers["brain"], b"...")) is None
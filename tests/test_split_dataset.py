@@ -0,0 +1,34 @@
+from split_dataset import split_files
+
+
+def make_tree(root, counts):
+    for class_name, count in counts.items():
+        (root / class_name).mkdir()
+        for i in range(count):
+            (root / class_name / f"{i:03d}.jpg").write_bytes(b"")
+
+
+def assignments(manifest):
+    return {record["path"]: record["split"] for record in manifest["records"]}
+
+
+def test_same_seed_gives_same_split(tmp_path):
+    make_tree(tmp_path, {"normal": 20, "tumor": 11})
+    fractions = {"train": 0.8, "test": 0.2}
+    first = split_files(str(tmp_path), fractions, seed=7)
+    assert split_files(str(tmp_path), fractions, seed=7) == first
+    assert assignments(split_files(str(tmp_path), fractions, seed=8)) != assignments(first)
+
+
+def test_split_is_stratified_and_complete(tmp_path):
+    make_tree(tmp_path, {"normal": 20, "tumor": 10})
+    manifest = split_files(str(tmp_path), {"train": 0.8, "test": 0.2})
+    assert len(assignments(manifest)) == 30
+    counts = {}
+    for record in manifest["records"]:
+        key = (record["class"], record["split"])
+        counts[key] = counts.get(key, 0) + 1
+    assert counts == {
+        ("normal", "train"): 16, ("normal", "test"): 4,
+        ("tumor", "train"): 8, ("tumor", "test"): 2,
+    }
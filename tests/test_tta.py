@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import tta
+
+
+@pytest.fixture
+def image():
+    return np.random.default_rng(0).random((20, 30, 3), dtype=np.float32)
+
+
+def test_identity_and_flip_are_exact(image):
+    out = np.empty_like(image)
+    np.testing.assert_array_equal(tta.warp(image, tta.VIEWS[0], out), image)
+    np.testing.assert_array_equal(tta.warp(image, tta.VIEWS[1], out), image[:, ::-1])
+
+
+def test_whole_pixel_shift_repeats_edge(image):
+    out = np.empty_like(image)
+    tta.warp(image, tta.View(1, 1.0, 0.1, 0.0), out)
+    np.testing.assert_array_equal(out[:, :-3], image[:, 3:])
+    np.testing.assert_array_equal(out[:, -3:], np.repeat(image[:, -1:], 3, axis=1))
+
+
+def test_expand_and_average(image):
+    batch = np.stack([image, image * 0.5])
+    expanded = tta.expand_batch(batch, views=3)
+    assert expanded.shape == (6, *image.shape)
+    np.testing.assert_array_equal(expanded[3], batch[1])
+    probabilities = np.arange(12, dtype=np.float32).reshape(6, 2)
+    np.testing.assert_allclose(tta.average_views(probabilities, views=3), [[2, 3], [8, 9]])
+
+
+def test_rejects_too_many_views(image):
+    with pytest.raises(ValueError):
+        tta.expand_batch(image[None], views=tta.MAX_VIEWS + 1)
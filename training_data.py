@@ -0,0 +1,243 @@
+"""tf.data input pipeline for training on the ``Training/``/``Testing/`` layout.
+
+Replaces ``ImageDataGenerator(...).flow_from_directory(...)`` from the
+notebooks. Compared with the generator it:
+
+- decodes and resizes JPEGs on all cores (``num_parallel_calls``),
+- caches the resized uint8 images in memory or in a file on disk, so every
+  JPEG is decoded once instead of once per epoch,
+- applies the augmentation to a whole batch at once as a single affine
+  transform per image, with the same flip/zoom/shear/shift/rotation ranges,
+- prefetches batches while the model trains.
+
+Images are decoded and resized by PIL with nearest-neighbour
+interpolation, as ``flow_from_directory`` does by default, so the model sees
+the same pixels as with the generator. Classes are indexed in alphabetical
+folder order, like ``flow_from_directory``, and labels are one-hot
+(``class_mode='categorical'``).
+
+Usage in a notebook:
+
+    from training_data import dataset_from_directory
+    train_data, class_names = dataset_from_directory("Training", augment=True, cache="train.cache")
+    test_data, _ = dataset_from_directory("Testing", shuffle=False, cache="memory")
+    vgg_model.fit(train_data, epochs=32, validation_data=test_data)
+
+Benchmark against the generator:
+
+    python training_data.py Training --epochs 2
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+from image_folders import list_source_files
+from preprocessing import INPUT_SIZE
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+# Same ranges as the notebooks' ImageDataGenerator
+AUGMENTATION = {
+    "horizontal_flip": True,
+    "zoom_range": 0.2,
+    "shear_range": 0.2,  # degrees, as in Keras
+    "width_shift_range": 0.2,
+    "height_shift_range": 0.2,
+    "rotation_range": 0.4,  # degrees
+}
+
+
+def _load_pixels(path, width, height):
+    # As keras.utils.load_img(path, target_size=..., interpolation="nearest").
+    # TensorFlow's own decoders and nearest resize round differently.
+    with Image.open(path.decode()) as image:
+        image = image.convert("RGB") if image.mode != "RGB" else image
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.NEAREST)
+        return np.asarray(image)
+
+
+def _decode(path, image_size):
+    height, width = image_size
+    # Cache uint8 pixels: four times smaller than float32
+    image = tf.numpy_function(_load_pixels, [path, width, height], tf.uint8, stateful=False)
+    image.set_shape((height, width, 3))
+    return image
+
+
+def _affine_transforms(batch_size, height, width, settings):
+    """Per-image output->input transforms for ImageProjectiveTransformV3."""
+    def uniform(limit):
+        return tf.random.uniform([batch_size], -limit, limit)
+
+    zero = tf.zeros([batch_size])
+    one = tf.ones([batch_size])
+    theta = uniform(math.radians(settings["rotation_range"]))
+    shear = uniform(math.radians(settings["shear_range"]))
+    tx = uniform(settings["width_shift_range"]) * width
+    ty = uniform(settings["height_shift_range"]) * height
+    zoom = settings["zoom_range"]
+    zx = tf.random.uniform([batch_size], 1 - zoom, 1 + zoom)
+    zy = tf.random.uniform([batch_size], 1 - zoom, 1 + zoom)
+    flip = tf.random.uniform([batch_size]) < 0.5 if settings["horizontal_flip"] else tf.zeros([batch_size], tf.bool)
+    fx = tf.where(flip, -one, one)
+
+    def matrix(rows):
+        return tf.stack([tf.stack(row, axis=-1) for row in rows], axis=-2)
+
+    rotation = matrix([[tf.cos(theta), -tf.sin(theta), zero], [tf.sin(theta), tf.cos(theta), zero], [zero, zero, one]])
+    shift = matrix([[one, zero, tx], [zero, one, ty], [zero, zero, one]])
+    shearing = matrix([[one, -tf.sin(shear), zero], [zero, tf.cos(shear), zero], [zero, zero, one]])
+    scaling = matrix([[zx * fx, zero, zero], [zero, zy, zero], [zero, zero, one]])
+    cx, cy = (width - 1) / 2, (height - 1) / 2
+    to_center = matrix([[one, zero, -cx * one], [zero, one, -cy * one], [zero, zero, one]])
+    from_center = matrix([[one, zero, cx * one], [zero, one, cy * one], [zero, zero, one]])
+
+    transform = from_center @ rotation @ shift @ shearing @ scaling @ to_center
+    flat = tf.reshape(transform, [batch_size, 9])
+    return flat[:, :8] / flat[:, 8:9]
+
+
+def augment_batch(images, settings=AUGMENTATION):
+    """Randomly flip, zoom, shear, shift and rotate a float image batch.
+
+    All transforms of an image are combined into one affine warp, and the
+    whole batch is warped by a single op. Pixels that fall outside the image
+    take the nearest edge value (``fill_mode='nearest'``).
+    """
+    shape = tf.shape(images)
+    transforms = _affine_transforms(shape[0], tf.cast(shape[1], tf.float32), tf.cast(shape[2], tf.float32), settings)
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=transforms,
+        output_shape=shape[1:3],
+        fill_value=0.0,
+        interpolation="BILINEAR",
+        fill_mode="NEAREST",
+    )
+
+
+def dataset_from_files(paths, labels, num_classes, batch_size=32, image_size=INPUT_SIZE,
+                       augment=False, shuffle=True, cache="memory", shuffle_buffer=512, seed=None):
+    """Build a batched ``(images, one_hot_labels)`` dataset from file paths.
+
+    ``cache`` is ``"memory"``, a file path prefix for an on-disk cache, or
+    ``None`` to decode every epoch. Images come out as float32 in [0, 1].
+    """
+    height, width = image_size[1], image_size[0]
+    dataset = tf.data.Dataset.from_tensor_slices((list(paths), list(labels)))
+    dataset = dataset.map(
+        lambda path, label: (_decode(path, (height, width)), label),
+        num_parallel_calls=AUTOTUNE,
+        deterministic=not shuffle,
+    )
+    if cache == "memory":
+        dataset = dataset.cache()
+    elif cache:
+        dataset = dataset.cache(cache)
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    return _finish(dataset.batch(batch_size, num_parallel_calls=AUTOTUNE), num_classes, augment)
+
+
+def _finish(dataset, num_classes, augment):
+    """Scale batched uint8 images to [0, 1], augment, one-hot and prefetch."""
+    def finish(images, label):
+        images = tf.cast(images, tf.float32) / 255.0
+        if augment:
+            images = augment_batch(images)
+        return images, tf.one_hot(label, num_classes)
+
+    return dataset.map(finish, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+
+
+def dataset_from_directory(directory, class_names=None, **kwargs):
+    """``flow_from_directory`` replacement; returns ``(dataset, class_names)``.
+
+    ``directory`` may also be one split of a ``split_dataset.py`` manifest,
+    e.g. ``"kidney_split.json:train"``.
+    """
+    paths, labels, class_names = list_source_files(directory, class_names)
+    return dataset_from_files(paths, labels, len(class_names), **kwargs), class_names
+
+
+def dataset_from_packed(source, batch_size=32, augment=False, shuffle=True, seed=None):
+    """Training dataset read from ``pack_dataset.py`` shards; no JPEG decoding.
+
+    Returns ``(dataset, class_names)``. Images are sliced straight out of the
+    memory-mapped shards, in a new random order every epoch when ``shuffle``.
+    The shards hold the app's preprocessing (bicubic resize), not the
+    nearest-neighbour pixels of ``dataset_from_directory``.
+    """
+    from pack_dataset import PackedDataset
+
+    packed = PackedDataset(source)
+    rng = np.random.default_rng(seed)
+
+    def generate():
+        order = rng.permutation(len(packed)) if shuffle else range(len(packed))
+        for i in order:
+            yield packed[int(i)], packed.labels[i]
+
+    dataset = tf.data.Dataset.from_generator(
+        generate,
+        output_signature=(
+            tf.TensorSpec(packed[0].shape, tf.uint8),
+            tf.TensorSpec((), tf.int64),
+        ),
+    )
+    dataset = _finish(dataset.batch(batch_size), len(packed.class_names), augment)
+    return dataset, packed.class_names
+
+
+def benchmark(directory, epochs=2, batch_size=32, augment=True, cache="memory"):
+    """Time full passes over ``directory`` with the generator and tf.data."""
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    generator = ImageDataGenerator(
+        rescale=1.0 / 255.0, fill_mode="nearest", **(AUGMENTATION if augment else {})
+    ).flow_from_directory(directory, batch_size=5, target_size=INPUT_SIZE, class_mode="categorical")
+    steps = math.ceil(generator.samples / generator.batch_size)
+    results = {"images": generator.samples, "generator_batch_size_5": [], f"tf_data_batch_size_{batch_size}": []}
+    for _ in range(epochs):
+        start = time.perf_counter()
+        for _ in range(steps):
+            next(generator)
+        results["generator_batch_size_5"].append(time.perf_counter() - start)
+
+    dataset, _ = dataset_from_directory(directory, batch_size=batch_size, augment=augment, cache=cache)
+    for _ in range(epochs):
+        start = time.perf_counter()
+        for _ in dataset:
+            pass
+        results[f"tf_data_batch_size_{batch_size}"].append(time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare epoch times of ImageDataGenerator and tf.data.")
+    parser.add_argument("directory", help="class-per-folder image tree, e.g. Training")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--no-augment", dest="augment", action="store_false")
+    parser.add_argument("--cache", default="memory", help='"memory", a cache file path, or "none"')
+    args = parser.parse_args()
+
+    results = benchmark(
+        args.directory, args.epochs, args.batch_size, args.augment,
+        None if args.cache == "none" else args.cache,
+    )
+    images = results.pop("images")
+    for name, times in results.items():
+        epochs = ", ".join(f"{t:.1f}s" for t in times)
+        # Later epochs read from the cache, so they show the steady state
+        steady = np.mean(times[1:] or times)
+        print(f"{name:24} epochs: {epochs}  (steady state {images / steady:.0f} images/s)")
+
+
+if __name__ == "__main__":
+    main()
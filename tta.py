@@ -0,0 +1,113 @@
+"""Test-time augmentation: classify several views of each image and average.
+
+The views are fixed flips, shifts and zooms inside the training
+augmentation ranges (``training_data.AUGMENTATION``: horizontal flip,
+±20% shift, ±20% zoom). ``expand_batch`` turns a batch of N images into
+N * K views, stacked image by image, so the model scores all of them in a
+single forward pass; ``average_views`` folds the probabilities back to N
+rows.
+
+Each view is one separable bilinear resampling, with pixels outside the
+image taking the nearest edge value like ``fill_mode='nearest'`` in
+training. The first view is the image itself, unchanged, so one view gives
+exactly the predictions without augmentation.
+
+``MEDICT_TTA_VIEWS`` sets the number of views K used by default (1, no
+augmentation, up to ``MAX_VIEWS``).
+"""
+import functools
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from preprocessing import timings
+
+# Output->input mapping, as in training: x_in = c + flip * zoom * (x_out - c) + shift_x * width
+View = namedtuple("View", ["flip", "zoom", "shift_x", "shift_y"])
+
+# In the order they are added as K grows: the strongest single views first
+VIEWS = (
+    View(1, 1.0, 0.0, 0.0),
+    View(-1, 1.0, 0.0, 0.0),
+    View(1, 0.9, 0.0, 0.0),
+    View(-1, 0.9, 0.0, 0.0),
+    View(1, 1.0, 0.1, 0.0),
+    View(1, 1.0, -0.1, 0.0),
+    View(1, 1.0, 0.0, 0.1),
+    View(1, 1.0, 0.0, -0.1),
+    View(1, 1.1, 0.0, 0.0),
+    View(-1, 1.1, 0.0, 0.0),
+)
+MAX_VIEWS = len(VIEWS)
+
+DEFAULT_VIEWS = int(os.environ.get("MEDICT_TTA_VIEWS", "1"))
+
+_buffers = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def _axis_map(length, scale, shift):
+    """Source indices and weights for resampling one axis.
+
+    Returns ``(low, high, weight)``, or ``(low, None, None)`` when every
+    source position falls on a whole pixel.
+    """
+    center = (length - 1) / 2
+    source = center + scale * (np.arange(length) - center) + shift * length
+    # Rounding keeps whole-pixel shifts such as 0.1 * 350 exact
+    source = np.clip(np.round(source, 6), 0, length - 1)
+    low = np.floor(source).astype(np.intp)
+    weight = (source - low).astype(np.float32)
+    if not weight.any():
+        return low, None, None
+    return low, np.minimum(low + 1, length - 1), weight
+
+
+def warp(image, view, out):
+    """Write ``view`` of an (H, W, C) float32 image into ``out``."""
+    height, width = image.shape[:2]
+    y_low, y_high, y_weight = _axis_map(height, view.zoom, view.shift_y)
+    x_low, x_high, x_weight = _axis_map(width, view.flip * view.zoom, view.shift_x)
+
+    rows = image[y_low]
+    if y_high is not None:
+        rows = rows + (image[y_high] - rows) * y_weight[:, None, None]
+    if x_high is None:
+        np.take(rows, x_low, axis=1, out=out)
+    else:
+        left = rows[:, x_low]
+        np.add(left, (rows[:, x_high] - left) * x_weight[None, :, None], out=out)
+    return out
+
+
+def views_buffer(size, shape):
+    """Return this thread's reusable float32 buffer for ``size`` views."""
+    buffer = getattr(_buffers, "array", None)
+    if buffer is None or len(buffer) < size or buffer.shape[1:] != shape:
+        buffer = np.empty((size, *shape), dtype=np.float32)
+        _buffers.array = buffer
+    return buffer[:size]
+
+
+def expand_batch(batch, views=DEFAULT_VIEWS):
+    """Return the first ``views`` views of every image, as one (N * views, H, W, C) batch.
+
+    The result is this thread's reusable buffer, overwritten by the next call.
+    """
+    if not 1 <= views <= MAX_VIEWS:
+        raise ValueError(f"TTA views must be between 1 and {MAX_VIEWS}, not {views}")
+    start = time.perf_counter()
+    out = views_buffer(len(batch) * views, batch.shape[1:])
+    for i, image in enumerate(batch):
+        for j, view in enumerate(VIEWS[:views]):
+            warp(image, view, out[i * views + j])
+    timings.add("tta", time.perf_counter() - start)
+    return out
+
+
+def average_views(probabilities, views=DEFAULT_VIEWS):
+    """Mean probabilities over the views of each image: (N * views, C) -> (N, C)."""
+    return probabilities.reshape(-1, views, probabilities.shape[-1]).mean(axis=1)